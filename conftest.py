@@ -0,0 +1,25 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def thumbnails_in_request(settings):
+    """Make post thumbnails right after commit instead of in a worker
+    thread, which could still be writing files and rows while a test
+    tears its media and database down."""
+    settings.POST_THUMBNAILS_ASYNC = False
+
+
+@pytest.fixture(autouse=True)
+def no_profiling(settings):
+    """Keep sampled profiles out of tests, the ones about profiling
+    turn it on."""
+    settings.PROFILING_SAMPLE_RATE = 0
+
+
+@pytest.fixture(autouse=True, scope='session')
+def metrics_in_tmp(tmp_path_factory):
+    """Keep metrics out of the project, test data included, which is
+    made before function fixtures run."""
+    from django.conf import settings
+
+    settings.METRICS_DIR = str(tmp_path_factory.mktemp('metrics'))
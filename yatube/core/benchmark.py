@@ -0,0 +1,195 @@
+"""Latency and query benchmarks of the named routes of the site.
+
+Every named route of APPS is requested through the test client against
+the current database, meant to be filled by generate_dataset first.
+Route arguments are taken from the busiest rows: the group and the
+author with the most posts, the post with the most comments, and the
+requests are made as the user who follows the most authors.
+"""
+import statistics
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode, urlsafe_base64_encode
+
+from posts.models import Group, Post, UserCounters
+
+from .db import QueryMeter
+from .profiling import profiled
+
+User = get_user_model()
+
+APPS = ('posts', 'users', 'about')
+# routes that change data on GET, their requests are rolled back
+ROLLED_BACK = {'posts:profile_follow', 'posts:profile_unfollow'}
+# latency changes smaller than this are noise, in milliseconds
+NOISE_MS = 5.0
+
+
+def named_routes(namespaces=APPS):
+    """Yield the name and argument names of every named route."""
+    resolver = get_resolver()
+    for namespace in namespaces:
+        _, app_resolver = resolver.namespace_dict[namespace]
+        for pattern in app_resolver.url_patterns:
+            if pattern.name:
+                yield (
+                    f'{namespace}:{pattern.name}',
+                    list(pattern.pattern.converters),
+                )
+
+
+class Sample:
+    """Route arguments and the user requests are made as."""
+
+    def __init__(self):
+        busiest = UserCounters.objects.select_related('user')
+        self.viewer = busiest.order_by('-following_count').first()
+        self.author = busiest.order_by('-posts_count').first()
+        self.group = Group.objects.annotate(
+            posts_total=Count('posts')
+        ).order_by('-posts_total').first()
+        self.post = Post.objects.order_by('-comments_count', 'pk').first()
+        if None in (self.viewer, self.author, self.group, self.post):
+            raise ValueError(
+                'The database has no posts, groups or user counters'
+            )
+        self.viewer = self.viewer.user
+        self.author = self.author.user
+
+    def arguments(self):
+        return {
+            'pk': self.group.slug,
+            'username': self.author.username,
+            'post_id': self.post.pk,
+            'uidb64': urlsafe_base64_encode(force_bytes(self.viewer.pk)),
+            'token': default_token_generator.make_token(self.viewer),
+        }
+
+    def query(self, route):
+        if route == 'posts:search':
+            return '?' + urlencode({'q': self.post.text.split()[0]})
+        return ''
+
+    def path(self, route, argument_names):
+        arguments = self.arguments()
+        return reverse(route, kwargs={
+            name: arguments[name] for name in argument_names
+        }) + self.query(route)
+
+
+class Probe(QueryMeter):
+    """Count and time the queries and template rendering of a request.
+
+    Render time includes the queries made by templates.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.render_time = 0.0
+
+    @contextmanager
+    def measure(self):
+        with self.installed(), profiled() as profile:
+            yield self
+        self.render_time = profile.durations['template']
+
+
+@contextmanager
+def rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+def run_route(client, route, path, repeat, warmup, prepare):
+    """Request path repeat times after warmup, return its figures."""
+    latencies, probes = [], []
+    for attempt in range(warmup + repeat):
+        prepare()
+        probe = Probe()
+        with rolled_back() if route in ROLLED_BACK else nullcontext():
+            with probe.measure():
+                started = time.perf_counter()
+                response = client.get(path)
+                latency = time.perf_counter() - started
+        if attempt >= warmup:
+            latencies.append(latency)
+            probes.append(probe)
+    return {
+        'path': path,
+        'status': response.status_code,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'queries': max(probe.count for probe in probes),
+        'sql_ms': statistics.median(
+            probe.time for probe in probes
+        ) * 1000,
+        'render_ms': statistics.median(
+            probe.render_time for probe in probes
+        ) * 1000,
+    }
+
+
+def run(repeat=20, warmup=2, routes=None, anonymous=False, cold=False):
+    """Benchmark the named routes, or only those in routes.
+
+    With cold, the cache is cleared before every request.
+    """
+    sample = Sample()
+    client = Client()
+
+    def prepare():
+        if cold:
+            cache.clear()
+        if not anonymous:
+            # logout and the like end the session of the client
+            client.force_login(sample.viewer)
+
+    results = {}
+    for route, argument_names in named_routes():
+        if routes and route not in routes:
+            continue
+        results[route] = run_route(
+            client, route, sample.path(route, argument_names),
+            repeat, warmup, prepare,
+        )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Describe the routes that got slower than baseline by more than
+    the threshold share, or make more queries."""
+    regressions = []
+    for route, result in results.items():
+        before = baseline.get(route)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append(
+                f'{route}: {before["queries"]} -> {result["queries"]} '
+                f'queries'
+            )
+        for figure in ('p50_ms', 'p95_ms'):
+            limit = max(
+                before[figure] * (1 + threshold), before[figure] + NOISE_MS
+            )
+            if result[figure] > limit:
+                regressions.append(
+                    f'{route}: {figure} {before[figure]:.1f} -> '
+                    f'{result[figure]:.1f}'
+                )
+    return regressions
@@ -0,0 +1,47 @@
+"""Instrumentation of database queries."""
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+SAVEPOINT_STATEMENTS = (
+    'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT',
+)
+
+
+class QueryMeter:
+    """Count queries and the time they take.
+
+    An instance is an execute_wrapper, installed() wraps every database
+    connection of the current thread with it.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            # savepoints only mark the transaction a request runs in,
+            # tests and benchmarks wrap requests in one and the site not
+            if not sql.startswith(SAVEPOINT_STATEMENTS):
+                self.count += 1
+            self.time += time.perf_counter() - started
+
+    @contextmanager
+    def installed(self):
+        with wrapped(self):
+            yield self
+
+
+@contextmanager
+def wrapped(wrapper):
+    """Install an execute_wrapper on every connection of the thread."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
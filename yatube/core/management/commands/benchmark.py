@@ -0,0 +1,101 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Request every named route of the site and report its latency, '
+        'queries, SQL and template time. Fill the database with '
+        'generate_dataset first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='How many measured requests to make per route.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='How many requests per route to make before measuring.',
+        )
+        parser.add_argument(
+            '--route',
+            action='append',
+            dest='routes',
+            help='Benchmark only this route, like posts:index. Repeatable.',
+        )
+        parser.add_argument(
+            '--anonymous',
+            action='store_true',
+            help='Make requests without logging in.',
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Clear the cache before every request.',
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark.json',
+            help='Where to save the results as JSON.',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Results to compare with, fail on regressions.',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.25,
+            help='Latency growth over the baseline that fails, as a share.',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as source:
+                    baseline = json.load(source)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Can not read the baseline: {error}')
+        # the toolbar and query logging of DEBUG would be measured too,
+        # and sampled profiles would take the place of the benchmark's
+        with override_settings(DEBUG=False, PROFILING_SAMPLE_RATE=0):
+            try:
+                results = benchmark.run(
+                    options['repeat'], options['warmup'], options['routes'],
+                    options['anonymous'], options['cold'],
+                )
+            except ValueError as error:
+                raise CommandError(error)
+        with open(options['output'], 'w', encoding='utf-8') as target:
+            json.dump(results, target, ensure_ascii=False, indent=2)
+        self.stdout.write(
+            f'{"route":32} {"status":>6} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"queries":>7} {"sql ms":>8} {"render ms":>9}'
+        )
+        for route, result in results.items():
+            self.stdout.write(
+                f'{route:32} {result["status"]:>6} '
+                f'{result["p50_ms"]:>8.1f} {result["p95_ms"]:>8.1f} '
+                f'{result["queries"]:>7} {result["sql_ms"]:>8.1f} '
+                f'{result["render_ms"]:>9.1f}'
+            )
+        if baseline is None:
+            return
+        regressions = benchmark.compare(
+            results, baseline, options['threshold']
+        )
+        if regressions:
+            raise CommandError(
+                'Regressions against the baseline:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('No regressions'))
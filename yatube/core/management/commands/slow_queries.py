@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import slow_queries
+
+
+class Command(BaseCommand):
+    help = (
+        'Sum up the slow query log by the shape of the queries, the '
+        'most time taken first, with the views and the query plan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log',
+            default=settings.SLOW_QUERY_LOG,
+            help='The log to read, its rotated backups are read too.',
+        )
+        parser.add_argument(
+            '--view',
+            help='Only queries of this view, like posts:index.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='How many shapes to show.',
+        )
+
+    def handle(self, *args, **options):
+        records = slow_queries.read_log(slow_queries.log_files(options['log']))
+        if options['view']:
+            records = (
+                record for record in records
+                if record['view'] == options['view']
+            )
+        shapes = slow_queries.aggregate(records)
+        if not shapes:
+            self.stdout.write('No slow queries')
+            return
+        for shape in shapes[:options['limit']]:
+            self.stdout.write(f'{shape}\n')
+        self.stdout.write(
+            f'{sum(shape.count for shape in shapes)} slow queries of '
+            f'{len(shapes)} shapes'
+        )
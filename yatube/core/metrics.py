@@ -0,0 +1,315 @@
+"""Metrics of the site in the Prometheus text format.
+
+Every process adds to its own file in METRICS_DIR, a memory-mapped
+table of sample keys and values, and a scrape sums the files of all
+processes. So the workers of a preforking server are reported
+together, while the threads of one process share its table under a
+lock. A scrape folds the files of stopped processes into one aggregate
+file, so counters only grow and the directory does not grow with every
+restart. METRICS_DIR must not be shared between hosts, process ids are
+checked on this one.
+"""
+import fcntl
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# the table starts with the length of its used part, then go entries
+# of a key length, a key padded to 8 bytes and a value
+USED = struct.Struct('<Q')
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+TABLE_SIZE = 64 * 1024
+TABLE_SUFFIX = '.metrics'
+AGGREGATE_TABLE = f'aggregate{TABLE_SUFFIX}'
+AGGREGATE_LOCK = 'aggregate.lock'
+# request latency, in seconds
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50, 100)
+
+REGISTRY = {}
+
+
+def entries(data):
+    """Yield the key, value offset and value of every table entry."""
+    used, = USED.unpack_from(data, 0)
+    position = USED.size
+    while position < used:
+        length, = KEY_LENGTH.unpack_from(data, position)
+        start = position + KEY_LENGTH.size
+        key = bytes(data[start:start + length]).decode()
+        offset = start + length + padding(length)
+        yield key, offset, VALUE.unpack_from(data, offset)[0]
+        position = offset + VALUE.size
+
+
+def padding(key_length):
+    return -(KEY_LENGTH.size + key_length) % 8
+
+
+class Table:
+    """Sample values of one process in a memory-mapped file."""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.truncate(TABLE_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = USED.unpack_from(self.map, 0)[0] or USED.size
+        self.offsets = {key: offset for key, offset, _ in entries(self.map)}
+
+    def add(self, *amounts):
+        """Add to the samples of (key, amount) pairs."""
+        with self.lock:
+            for key, amount in amounts:
+                offset = self.offsets.get(key)
+                if offset is None:
+                    offset = self.append(key)
+                value, = VALUE.unpack_from(self.map, offset)
+                VALUE.pack_into(self.map, offset, value + amount)
+
+    def append(self, key):
+        encoded = key.encode()
+        offset = (
+            self.used + KEY_LENGTH.size + len(encoded) + padding(len(encoded))
+        )
+        end = offset + VALUE.size
+        if end > len(self.map):
+            size = max(end, len(self.map) * 2)
+            self.map.close()
+            self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), 0)
+        KEY_LENGTH.pack_into(self.map, self.used, len(encoded))
+        start = self.used + KEY_LENGTH.size
+        self.map[start:start + len(encoded)] = encoded
+        VALUE.pack_into(self.map, offset, 0.0)
+        # a scrape sees the entry only when it is complete
+        self.used = end
+        USED.pack_into(self.map, 0, self.used)
+        self.offsets[key] = offset
+        return offset
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def table():
+    """The table of the current process, a forked one gets its own."""
+    key = (os.getpid(), settings.METRICS_DIR)
+    found = _tables.get(key)
+    if found is None:
+        with _tables_lock:
+            found = _tables.get(key)
+            if found is None:
+                os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                found = _tables[key] = Table(os.path.join(
+                    settings.METRICS_DIR, f'{os.getpid()}{TABLE_SUFFIX}'
+                ))
+    return found
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # a process of another user
+        pass
+    return True
+
+
+def fold_stopped(directory, names):
+    """Add the tables of stopped processes to the aggregate table and
+    remove them."""
+    stopped = [
+        name for name in names
+        if name.endswith(TABLE_SUFFIX)
+        and name[:-len(TABLE_SUFFIX)].isdigit()
+        and not is_alive(int(name[:-len(TABLE_SUFFIX)]))
+    ]
+    if not stopped:
+        return
+    # scrapes of other workers may fold the same files at once
+    with open(os.path.join(directory, AGGREGATE_LOCK), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        aggregate = Table(os.path.join(directory, AGGREGATE_TABLE))
+        try:
+            for name in stopped:
+                path = os.path.join(directory, name)
+                try:
+                    with open(path, 'rb') as source:
+                        data = source.read()
+                except FileNotFoundError:
+                    # folded by another scrape already
+                    continue
+                if data:
+                    aggregate.add(*(
+                        (key, value) for key, _, value in entries(data)
+                    ))
+                os.remove(path)
+        finally:
+            aggregate.close()
+
+
+def collect():
+    """Sum the samples of every process, by sample name and labels."""
+    samples = defaultdict(lambda: defaultdict(float))
+    directory = settings.METRICS_DIR
+    names = ()
+    if os.path.isdir(directory):
+        fold_stopped(directory, os.listdir(directory))
+        names = os.listdir(directory)
+    for name in names:
+        if not name.endswith(TABLE_SUFFIX):
+            continue
+        with open(os.path.join(directory, name), 'rb') as source:
+            data = source.read()
+        if not data:
+            continue
+        for key, _, value in entries(data):
+            sample, labels = json.loads(key)
+            samples[sample][tuple(map(tuple, labels))] += value
+    return samples
+
+
+def format_value(value):
+    return '+Inf' if value == math.inf else repr(float(value))
+
+
+def format_sample(name, labels, value):
+    if labels:
+        pairs = ','.join(
+            '{}="{}"'.format(label, text.replace('\\', r'\\')
+                             .replace('"', r'\"').replace('\n', r'\n'))
+            for label, text in labels
+        )
+        name = f'{name}{{{pairs}}}'
+    return f'{name} {format_value(value)}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        REGISTRY[name] = self
+
+    def key(self, suffix, labels, *extra):
+        if set(labels) != set(self.labels):
+            raise ValueError(
+                f'{self.name} has labels {self.labels}, not {tuple(labels)}'
+            )
+        pairs = [(label, str(labels[label])) for label in self.labels]
+        return json.dumps(
+            [self.name + suffix, pairs + list(extra)], ensure_ascii=False
+        )
+
+    def expose(self, samples):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.kind}'
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        table().add((self.key('_total', labels), amount))
+
+    def expose(self, samples):
+        yield from super().expose(samples)
+        name = self.name + '_total'
+        for labels, value in sorted(samples[name].items()):
+            yield format_sample(name, labels, value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        bound = next(bound for bound in self.buckets if value <= bound)
+        table().add(
+            (self.key('_bucket', labels, ('le', format_value(bound))), 1),
+            (self.key('_sum', labels), value),
+            (self.key('_count', labels), 1),
+        )
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes, in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def expose(self, samples):
+        yield from super().expose(samples)
+        # buckets are stored apart and reported cumulative
+        buckets = samples[self.name + '_bucket']
+        for labels, count in sorted(samples[self.name + '_count'].items()):
+            cumulative = 0
+            for bound in self.buckets:
+                bucket = labels + (('le', format_value(bound)),)
+                cumulative += buckets.get(bucket, 0)
+                yield format_sample(
+                    self.name + '_bucket', bucket, cumulative
+                )
+            yield format_sample(
+                self.name + '_sum', labels, samples[self.name + '_sum'][labels]
+            )
+            yield format_sample(self.name + '_count', labels, count)
+
+
+def exposition():
+    """Every registered metric in the Prometheus text format."""
+    samples = collect()
+    lines = []
+    for metric in REGISTRY.values():
+        lines.extend(metric.expose(samples))
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds',
+    'Time to respond to a request, by view.',
+    LATENCY_BUCKETS, labels=('view',),
+)
+REQUEST_QUERIES = Histogram(
+    'yatube_request_queries',
+    'Database queries made by a request, by view.',
+    QUERY_BUCKETS, labels=('view',),
+)
+FRAGMENT_CACHE_HITS = Counter(
+    'yatube_fragment_cache_hits',
+    'Template fragments found in the cache, by fragment.',
+    labels=('fragment',),
+)
+FRAGMENT_CACHE_MISSES = Counter(
+    'yatube_fragment_cache_misses',
+    'Template fragments rendered for the cache, by fragment.',
+    labels=('fragment',),
+)
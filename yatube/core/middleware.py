@@ -0,0 +1,174 @@
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+
+from . import metrics
+from .db import QueryMeter, wrapped
+from .nplusone import NPlusOneError, QueryRecorder, report
+from .profiling import profiled
+from .slow_queries import SlowQueryLog
+
+logger = logging.getLogger(__name__)
+profile_logger = logging.getLogger('core.profiling')
+# phases of a profile in the order of the Server-Timing header
+PHASES = ('url', 'view', 'sql', 'template', 'thumbnails')
+
+
+class MetricsMiddleware:
+    """Observe the latency and the queries of every request by the
+    name of its view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with QueryMeter().installed() as meter:
+            response = self.get_response(request)
+        view = getattr(request.resolver_match, 'view_name', 'unresolved')
+        metrics.REQUEST_DURATION.observe(
+            time.perf_counter() - started, view=view
+        )
+        metrics.REQUEST_QUERIES.observe(meter.count, view=view)
+        return response
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(request):
+    """Most queries the view of request may make, None for no limit."""
+    match = request.resolver_match
+    if match is None:
+        return None
+    return settings.QUERY_BUDGETS.get(match.view_name)
+
+
+class QueryBudgetMiddleware:
+    """Check the queries of a request against QUERY_BUDGETS.
+
+    Going over the budget is logged as a warning, or raises
+    QueryBudgetExceeded with QUERY_BUDGETS_STRICT, as in tests.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryMeter().installed() as meter:
+            response = self.get_response(request)
+        budget = query_budget(request)
+        if budget is not None and meter.count > budget:
+            message = (
+                f'{request.resolver_match.view_name} made {meter.count} '
+                f'queries, the budget is {budget}: {request.get_full_path()}'
+            )
+            if settings.QUERY_BUDGETS_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class NPlusOneMiddleware:
+    """Report query shapes a request repeats more than
+    NPLUSONE_THRESHOLD times, with NPLUSONE_DETECTION on.
+
+    Repeats are logged as a warning, or raise NPlusOneError with
+    NPLUSONE_STRICT.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.NPLUSONE_DETECTION:
+            return self.get_response(request)
+        with QueryRecorder().installed() as recorder:
+            response = self.get_response(request)
+        repeats = recorder.repeats()
+        if repeats:
+            message = f'{request.get_full_path()}: {report(repeats)}'
+            if settings.NPLUSONE_STRICT:
+                raise NPlusOneError(message)
+            logger.warning(message)
+        return response
+
+
+class SlowQueryMiddleware:
+    """Log queries slower than SLOW_QUERY_THRESHOLD seconds with the
+    view and the query plan; None turns it off."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.SLOW_QUERY_THRESHOLD
+        if threshold is None:
+            return self.get_response(request)
+        with wrapped(SlowQueryLog(request, threshold)):
+            return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """Time the phases of a share of requests, PROFILING_SAMPLE_RATE.
+
+    URL resolution, the view, SQL, template rendering and thumbnail
+    generation are reported in the Server-Timing header and logged to
+    core.profiling as JSON. Must be the last middleware: the URL phase
+    is the time until process_view, the view phase the time after it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with profiled() as profile, QueryMeter().installed() as meter:
+            profile.started = started
+            request.profile = profile
+            response = self.get_response(request)
+            if hasattr(profile, 'view_started'):
+                profile.add('view', time.perf_counter() - profile.view_started)
+        profile.add('sql', meter.time, meter.count)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = server_timing(profile, total)
+        profile_logger.info(json.dumps({
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'queries': meter.count,
+            **{
+                f'{phase}_ms': round(profile.durations[phase] * 1000, 2)
+                for phase in PHASES
+            },
+        }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # profiles of sampled requests only, not of the benchmark's
+        profile = getattr(request, 'profile', None)
+        if profile is not None:
+            now = time.perf_counter()
+            profile.add('url', now - profile.started)
+            profile.view_started = now
+
+
+def server_timing(profile, total):
+    metrics = []
+    for phase in PHASES:
+        if phase not in profile.counts:
+            continue
+        metric = f'{phase};dur={profile.durations[phase] * 1000:.2f}'
+        if phase == 'sql':
+            metric += f';desc="{profile.counts[phase]} queries"'
+        metrics.append(metric)
+    metrics.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(metrics)
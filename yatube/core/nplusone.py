@@ -0,0 +1,126 @@
+"""Detection of N+1 queries.
+
+Queries of a request are grouped by their shape, the SQL with every
+parameter and literal replaced by a placeholder. A shape that repeats
+more than a few times is almost always a lookup made once per row of
+a list, like comment.author in a loop over comments. Every repeat is
+traced to the template line or, outside templates, to the line of the
+project's code that made it.
+"""
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.base import Node
+
+from . import db
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+SPACES = re.compile(r'\s+')
+COLUMNS = re.compile(r'^SELECT .+? FROM ')
+RENDER_NODE = Node.render_annotated.__code__
+# origins listed for a repeated shape
+ORIGINS_SHOWN = 3
+# frames of the instrumentation itself are not origins
+OWN_FILES = {__file__, db.__file__}
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """The shape of a query: its SQL without parameters and literals."""
+    shape = LITERALS.sub('?', sql)
+    shape = LISTS.sub('(...)', shape)
+    return SPACES.sub(' ', shape).strip()
+
+
+def query_origin(frame):
+    """Where a query comes from: the innermost template node being
+    rendered, or else the innermost frame of the project's code."""
+    code_line = None
+    while frame is not None:
+        if frame.f_code is RENDER_NODE:
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                name = origin.template_name or origin.name
+                return f'{name}:{token.lineno}'
+        elif code_line is None and is_project_code(frame.f_code):
+            path = os.path.relpath(frame.f_code.co_filename, settings.BASE_DIR)
+            code_line = f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return code_line or 'unknown'
+
+
+def is_project_code(code):
+    return (
+        code.co_filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in code.co_filename
+        and code.co_filename not in OWN_FILES
+    )
+
+
+class Repeat:
+    """A query shape made more times than allowed."""
+
+    def __init__(self, shape, count, origins):
+        self.shape = shape
+        self.count = count
+        self.origins = origins
+
+    def __str__(self):
+        shape = COLUMNS.sub('SELECT ... FROM ', self.shape)
+        lines = [f'{self.count} x {shape}']
+        lines += [
+            f'    {count} from {origin}'
+            for origin, count in self.origins.most_common(ORIGINS_SHOWN)
+        ]
+        return '\n'.join(lines)
+
+
+class QueryRecorder(db.QueryMeter):
+    """Count queries by shape and remember where they come from."""
+
+    def __init__(self):
+        super().__init__()
+        self.shapes = Counter()
+        self.origins = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = fingerprint(sql)
+        self.shapes[shape] += 1
+        self.origins[shape][query_origin(sys._getframe(1))] += 1
+        return super().__call__(execute, sql, params, many, context)
+
+    def repeats(self, threshold=None):
+        """Shapes made more than threshold times, the most made first."""
+        if threshold is None:
+            threshold = settings.NPLUSONE_THRESHOLD
+        return [
+            Repeat(shape, count, self.origins[shape])
+            for shape, count in self.shapes.most_common()
+            if count > threshold
+        ]
+
+
+def report(repeats):
+    return 'Repeated queries:\n' + '\n'.join(map(str, repeats))
+
+
+@contextmanager
+def forbid_n_plus_one(threshold=None):
+    """Fail with NPlusOneError if a query shape made in the block
+    repeats more than threshold times, NPLUSONE_THRESHOLD by default.
+    For tests."""
+    with QueryRecorder().installed() as recorder:
+        yield recorder
+    repeats = recorder.repeats(threshold)
+    if repeats:
+        raise NPlusOneError(report(repeats))
@@ -0,0 +1,78 @@
+"""Timing of the phases of a request.
+
+Code marks a phase with timed(name). While a Profile is active in the
+thread, the time of the phase is added to it; otherwise timed() costs
+next to nothing. Phases nested in a phase of the same name, like
+included templates, are counted once.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.template.backends import django as django_backend
+
+_local = threading.local()
+
+
+class Profile:
+    """Durations, in seconds, and counts of the phases of a request."""
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+        self.running = Counter()
+
+    def add(self, name, duration, count=1):
+        self.durations[name] += duration
+        self.counts[name] += count
+
+
+def active_profile():
+    return getattr(_local, 'profile', None)
+
+
+@contextmanager
+def profiled():
+    """Collect the phases timed in the block into a new Profile."""
+    previous = active_profile()
+    _local.profile = Profile()
+    try:
+        yield _local.profile
+    finally:
+        _local.profile = previous
+
+
+@contextmanager
+def timed(name):
+    profile = active_profile()
+    if profile is None or profile.running[name]:
+        yield
+        return
+    profile.running[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.running[name] -= 1
+        profile.add(name, time.perf_counter() - started)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend, with rendering timed."""
+
+    def from_string(self, template_code):
+        return Template(
+            super().from_string(template_code).template, self
+        )
+
+    def get_template(self, template_name):
+        return Template(
+            super().get_template(template_name).template, self
+        )
@@ -0,0 +1,138 @@
+"""Log of slow database queries with their query plans.
+
+Every query of a request that takes longer than SLOW_QUERY_THRESHOLD
+is logged to core.slow_queries as a JSON line with the view, the time
+it took and the plan the database chose for it. The log is written to
+SLOW_QUERY_LOG and rotated; the slow_queries command sums it up by
+the shape of the queries, as N+1 detection groups them.
+"""
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+from django.utils import timezone
+
+from .nplusone import COLUMNS, fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def explain(connection, sql, params):
+    """Lines of the plan of a query, empty when it can not be had."""
+    if not connection.features.supports_explaining_query_execution:
+        return []
+    # a cursor of the driver, so that the plan is not a query of the
+    # request for the execute wrappers that count them
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(
+            f'{connection.ops.explain_query_prefix()} {sql}', params
+        )
+        rows = cursor.fetchall()
+    except connection.Database.Error:
+        return []
+    finally:
+        cursor.close()
+    # sqlite describes every step in the last column
+    return [str(row[-1]) for row in rows]
+
+
+class SlowQueryLog:
+    """Log the queries of a request slower than the threshold.
+
+    An execute_wrapper, install it with connection.execute_wrapper().
+    """
+
+    def __init__(self, request, threshold):
+        self.request = request
+        self.threshold = threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration > self.threshold:
+            self.log(context['connection'], sql, params, many, duration)
+        return result
+
+    def log(self, connection, sql, params, many, duration):
+        plan = [] if many else explain(connection, sql, params)
+        match = self.request.resolver_match
+        # parameters are left out, they may be passwords or sessions
+        logger.warning(json.dumps({
+            'time': timezone.now().isoformat(),
+            'view': match.view_name if match else None,
+            'path': self.request.path,
+            'duration_ms': round(duration * 1000, 2),
+            'sql': sql,
+            'plan': plan,
+        }, ensure_ascii=False))
+
+
+def log_files(path):
+    """The log and its rotated backups, the oldest first."""
+    backups = []
+    while os.path.exists(f'{path}.{len(backups) + 1}'):
+        backups.append(f'{path}.{len(backups) + 1}')
+    return backups[::-1] + [path]
+
+
+def read_log(paths):
+    """Yield the records of the log files, skipping broken lines."""
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as source:
+                for line in source:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+class Shape:
+    """Slow queries of one shape."""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.views = Counter()
+        self.plans = Counter()
+
+    def add(self, record):
+        self.count += 1
+        self.total_ms += record['duration_ms']
+        self.max_ms = max(self.max_ms, record['duration_ms'])
+        self.views[record['view'] or 'unresolved'] += 1
+        self.plans[tuple(record['plan'])] += 1
+
+    def __str__(self):
+        views = ', '.join(
+            f'{view} ({count})' for view, count in self.views.most_common()
+        )
+        lines = [
+            f'{self.count} x, {self.total_ms:.0f} ms in all, '
+            f'{self.max_ms:.0f} ms at most: {views}',
+            '    ' + COLUMNS.sub('SELECT ... FROM ', self.shape),
+        ]
+        plan, _ = self.plans.most_common(1)[0]
+        lines += [f'    | {step}' for step in plan]
+        return '\n'.join(lines)
+
+
+def aggregate(records):
+    """Group records by query shape, the most time taken first."""
+    shapes = {}
+    for record in records:
+        shape = fingerprint(record['sql'])
+        if shape not in shapes:
+            shapes[shape] = Shape(shape)
+        shapes[shape].add(record)
+    return sorted(
+        shapes.values(), key=lambda shape: shape.total_ms, reverse=True
+    )
@@ -0,0 +1,47 @@
+"""The cache tag, counting hits and misses of every fragment.
+
+Takes the place of Django's {% load cache %} through the libraries
+option of the template engine, so templates stay as they are.
+"""
+from django import template
+from django.templatetags.cache import CacheNode, do_cache
+
+from core.metrics import FRAGMENT_CACHE_HITS, FRAGMENT_CACHE_MISSES
+
+register = template.Library()
+
+# set in the render context when the nodes of a fragment are rendered
+RENDERED = 'metered_cache.rendered'
+
+
+class FragmentNodes(template.NodeList):
+    """Nodes of a cached fragment, rendered on a cache miss only."""
+
+    def render(self, context):
+        context.render_context[RENDERED] = True
+        return super().render(context)
+
+
+class MeteredCacheNode(CacheNode):
+    def render(self, context):
+        # a fragment may be cached inside another one
+        outer = context.render_context.get(RENDERED, False)
+        context.render_context[RENDERED] = False
+        try:
+            value = super().render(context)
+            if context.render_context[RENDERED]:
+                FRAGMENT_CACHE_MISSES.inc(fragment=self.fragment_name)
+            else:
+                FRAGMENT_CACHE_HITS.inc(fragment=self.fragment_name)
+        finally:
+            context.render_context[RENDERED] = outer
+        return value
+
+
+@register.tag('cache')
+def do_metered_cache(parser, token):
+    node = do_cache(parser, token)
+    return MeteredCacheNode(
+        FragmentNodes(node.nodelist), node.expire_time_var,
+        node.fragment_name, node.vary_on, node.cache_name,
+    )
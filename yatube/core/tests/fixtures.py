@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+
+from posts.counters import recount_users
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def make_feeds():
+    """Create a reader following three authors with commented posts,
+    every other one in a group from the first on, author_2 writing the
+    most, and return the reader."""
+    reader = User.objects.create(username='Chitatel')
+    group = Group.objects.create(title='Группа', slug='gruppa')
+    for index in range(0, 3):
+        author = User.objects.create(username=f'author_{index}')
+        Follow.objects.create(user=reader, author=author)
+        for number in range(0, index + 2):
+            post = Post.objects.create(
+                text=f'Пост номер {number}',
+                author=author,
+                group=None if number % 2 else group,
+            )
+            Comment.objects.create(
+                post=post, author=author, text='Комментарий'
+            )
+            Comment.objects.create(post=post, author=reader, text='Ответ')
+    # the views keep counters, rows made through the ORM skip them
+    recount_users(batch_size=100)
+    return reader
@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts.models import Follow
+
+from ..benchmark import compare, named_routes
+from .fixtures import make_feeds
+
+RESULT = {
+    'path': '/', 'status': 200, 'p50_ms': 10.0, 'p95_ms': 20.0,
+    'queries': 3, 'sql_ms': 1.0, 'render_ms': 5.0,
+}
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_feeds()
+
+    def setUp(self):
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False)
+        output.close()
+        self.output = output.name
+        self.addCleanup(os.remove, self.output)
+
+    def benchmark(self, **options):
+        call_command(
+            'benchmark', repeat=2, warmup=0, output=self.output,
+            stdout=StringIO(), **options
+        )
+        with open(self.output, encoding='utf-8') as results:
+            return json.load(results)
+
+    def test_every_named_route_is_measured(self):
+        """Checking if every named route is requested and reported."""
+        results = self.benchmark()
+
+        self.assertEqual(set(results), {name for name, _ in named_routes()})
+        self.assertEqual(results['posts:profile']['path'],
+                         '/profile/author_2/')
+        self.assertEqual(results['posts:follow_index']['status'], 200)
+        for route, result in results.items():
+            with self.subTest(route=route):
+                self.assertLess(result['status'], 500)
+                self.assertGreater(result['queries'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+
+    def test_following_routes_are_rolled_back(self):
+        """Checking if routes that change data on GET leave it as is."""
+        self.benchmark(routes=['posts:profile_unfollow'])
+
+        self.assertTrue(Follow.objects.exists())
+
+    def test_regressions_fail_the_command(self):
+        """Checking if a route slower than the baseline is an error."""
+        baseline = tempfile.NamedTemporaryFile(
+            'w', suffix='.json', delete=False, encoding='utf-8'
+        )
+        with baseline:
+            json.dump({'about:tech': dict(RESULT, queries=0)}, baseline)
+        self.addCleanup(os.remove, baseline.name)
+
+        with self.assertRaisesMessage(CommandError, 'about:tech'):
+            self.benchmark(routes=['about:tech'], baseline=baseline.name)
+
+    def test_compare_allows_noise(self):
+        """Checking if small and relative slowdowns within the threshold
+        are not regressions."""
+        baseline = {'posts:index': RESULT}
+
+        self.assertEqual(compare(
+            {'posts:index': dict(RESULT, p50_ms=14.0, p95_ms=24.0)},
+            baseline, 0.2,
+        ), [])
+        self.assertEqual(len(compare(
+            {'posts:index': dict(RESULT, p95_ms=30.0, queries=4)},
+            baseline, 0.2,
+        )), 2)
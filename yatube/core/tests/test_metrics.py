@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import metrics
+
+User = get_user_model()
+
+EVENTS = metrics.Counter('test_events', 'Events of tests.', labels=('kind',))
+SIZES = metrics.Histogram('test_sizes', 'Sizes of tests.', (1, 10))
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='Admin', is_staff=True)
+        cls.author = User.objects.create(username='Avtor')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        metrics_dir = override_settings(METRICS_DIR=self.directory)
+        metrics_dir.enable()
+        self.addCleanup(metrics_dir.disable)
+        self.admin_client = Client()
+        self.admin_client.force_login(MetricsTests.admin)
+        cache.clear()
+
+    def test_processes_are_summed(self):
+        """Checking if samples of every process file are added up."""
+        other = metrics.Table(os.path.join(self.directory, '1.metrics'))
+        other.add((EVENTS.key('_total', {'kind': 'a'}), 2))
+        EVENTS.inc(kind='a')
+        EVENTS.inc(kind='b')
+
+        exposition = metrics.exposition()
+
+        self.assertIn('test_events_total{kind="a"} 3.0', exposition)
+        self.assertIn('test_events_total{kind="b"} 1.0', exposition)
+
+    def test_stopped_processes_are_folded(self):
+        """Checking if the file of a stopped process is folded into the
+        aggregate one and its samples are still reported."""
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        stopped = metrics.Table(
+            os.path.join(self.directory, f'{process.pid}.metrics')
+        )
+        stopped.add((EVENTS.key('_total', {'kind': 'a'}), 2))
+        stopped.close()
+        EVENTS.inc(kind='a')
+
+        for _ in range(2):
+            self.assertIn(
+                'test_events_total{kind="a"} 3.0', metrics.exposition()
+            )
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            [f'{os.getpid()}.metrics', metrics.AGGREGATE_LOCK,
+             metrics.AGGREGATE_TABLE],
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Checking if histograms are exposed the way Prometheus reads
+        them."""
+        for size in (0.5, 5, 5, 50):
+            SIZES.observe(size)
+
+        exposition = metrics.exposition()
+
+        for line in ('# TYPE test_sizes histogram',
+                     'test_sizes_bucket{le="1.0"} 1.0',
+                     'test_sizes_bucket{le="10.0"} 3.0',
+                     'test_sizes_bucket{le="+Inf"} 4.0',
+                     'test_sizes_sum 60.5',
+                     'test_sizes_count 4.0'):
+            with self.subTest(line=line):
+                self.assertIn(line, exposition)
+
+    def test_table_grows_and_reopens(self):
+        """Checking if a table outgrowing its file keeps every sample,
+        also after it is opened again."""
+        path = os.path.join(self.directory, 'grown.metrics')
+        table = metrics.Table(path)
+        keys = [f'["key_{index:05}", []]' for index in range(5000)]
+        for key in keys:
+            table.add((key, 1))
+        table.add((keys[0], 1))
+
+        values = dict(
+            (key, value) for key, _, value in
+            metrics.entries(metrics.Table(path).map)
+        )
+
+        self.assertEqual(len(values), len(keys))
+        self.assertEqual(values[keys[0]], 2)
+        self.assertEqual(values[keys[-1]], 1)
+
+    def test_threads_lose_no_increments(self):
+        """Checking if threads of one process share its table safely."""
+        def count():
+            for _ in range(500):
+                EVENTS.inc(kind='thread')
+
+        threads = [threading.Thread(target=count) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertIn(
+            'test_events_total{kind="thread"} 4000.0', metrics.exposition()
+        )
+
+    def test_metrics_page_is_for_admins_only(self):
+        """Checking if only staff can read the metrics page."""
+        client = Client()
+        client.force_login(MetricsTests.author)
+
+        for page_client, status in ((Client(), 302), (client, 302),
+                                    (self.admin_client, 200)):
+            with self.subTest(client=page_client):
+                response = page_client.get(reverse('metrics'))
+                self.assertEqual(response.status_code, status)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+
+    def test_requests_are_observed_by_view(self):
+        """Checking if latency, queries and fragment cache hits of
+        requests are reported by view and fragment."""
+        Client().get(reverse('posts:index'))
+        Client().get(reverse('posts:index'))
+
+        content = self.admin_client.get(reverse('metrics')).content.decode()
+
+        for line in (
+            'yatube_request_duration_seconds_count{view="posts:index"} 2.0',
+            'yatube_request_queries_count{view="posts:index"} 2.0',
+            'yatube_fragment_cache_misses_total{fragment="index_page"} 1.0',
+            'yatube_fragment_cache_hits_total{fragment="index_page"} 1.0',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, content)
+
+    def test_created_objects_are_counted(self):
+        """Checking if new posts are counted and edits are not."""
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        post.text = 'Исправленный пост'
+        post.save()
+
+        self.assertIn('yatube_posts_created_total 1.0', metrics.exposition())
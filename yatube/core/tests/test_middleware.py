@@ -0,0 +1,239 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Engine
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.counters import recount_users
+from posts.models import Comment, Follow, Group, Post
+
+from ..benchmark import Sample, named_routes
+from ..middleware import QueryBudgetExceeded
+from ..nplusone import NPlusOneError, fingerprint, forbid_n_plus_one
+from ..profiling import active_profile, profiled, timed
+from .fixtures import make_feeds
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGETS_STRICT=True)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = make_feeds()
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorised_client = Client()
+        self.authorised_client.force_login(QueryBudgetTests.reader)
+
+    def test_every_posts_route_has_a_budget(self):
+        """Checking if no posts view goes without a query budget."""
+        routes = {name for name, _ in named_routes(['posts'])}
+
+        self.assertLessEqual(routes, set(settings.QUERY_BUDGETS))
+
+    def test_pages_stay_within_budgets(self):
+        """Checking if pages keep to their budgets with a cold cache,
+        for guests and users."""
+        sample = Sample()
+        for route, argument_names in named_routes():
+            if route not in settings.QUERY_BUDGETS:
+                continue
+            for client in (self.guest_client, self.authorised_client):
+                with self.subTest(route=route, client=client):
+                    cache.clear()
+                    client.get(sample.path(route, argument_names))
+
+    def test_forms_stay_within_budgets(self):
+        """Checking if sending forms keeps to the budgets."""
+        self.authorised_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'}
+        )
+        post = Post.objects.get(text='Новый пост')
+        self.authorised_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Исправленный пост'},
+        )
+        self.authorised_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'},
+        )
+
+    def test_following_stays_within_budgets(self):
+        """Checking if following an author for the first time and
+        unfollowing them keeps to the budgets."""
+        author = User.objects.create(username='Novichok')
+        Post.objects.create(text='Пост новичка', author=author)
+        recount_users(batch_size=100)
+
+        for route in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(route=route):
+                self.authorised_client.get(
+                    reverse(route, kwargs={'username': author.username})
+                )
+        self.assertFalse(Follow.objects.filter(author=author).exists())
+
+    @override_settings(QUERY_BUDGETS={'about:tech': 0})
+    def test_going_over_budget_raises_in_strict_mode(self):
+        """Checking if a request over its budget is an error."""
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'about:tech'):
+            self.authorised_client.get(reverse('about:tech'))
+
+    @override_settings(QUERY_BUDGETS={'about:tech': 0},
+                       QUERY_BUDGETS_STRICT=False)
+    def test_going_over_budget_is_logged(self):
+        """Checking if a request over its budget is only logged
+        outside of the strict mode."""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            response = self.authorised_client.get(reverse('about:tech'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('about:tech made 2 queries, the budget is 0',
+                      logs.output[0])
+
+
+@override_settings(NPLUSONE_DETECTION=True, NPLUSONE_STRICT=True,
+                   NPLUSONE_THRESHOLD=3)
+class NPlusOneTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(username='Chitatel')
+        group = Group.objects.create(title='Группа', slug='gruppa')
+        cls.post = Post.objects.create(
+            text='Обсуждаемый пост', author=cls.reader, group=group
+        )
+        for index in range(0, 6):
+            author = User.objects.create(username=f'author_{index}')
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(
+                text=f'Пост номер {index}', author=author, group=group
+            )
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий'
+            )
+
+    def setUp(self):
+        self.client.force_login(NPlusOneTests.reader)
+        cache.clear()
+
+    def test_fingerprint_ignores_parameters(self):
+        """Checking if queries differing in parameters have one shape."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s) AND a = 'x'"),
+            fingerprint('SELECT *  FROM t WHERE id IN (1, 2, 3) AND a = 7'),
+        )
+
+    def test_posts_pages_repeat_no_queries(self):
+        """Checking if feeds and the post page do not look related rows
+        up one by one."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'pk': 'gruppa'}),
+            reverse('posts:profile', kwargs={'username': 'author_1'}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail',
+                    kwargs={'post_id': NPlusOneTests.post.pk}),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                self.client.get(page)
+
+    def test_repeats_are_traced_to_template_lines(self):
+        """Checking if a lookup per row made in a template is reported
+        with the template and its line."""
+        comments = Comment.objects.all()
+        template = Engine(debug=True).from_string(
+            '{% for comment in comments %}\n'
+            '{{ comment.author.username }}\n'
+            '{% endfor %}'
+        )
+
+        with self.assertRaises(NPlusOneError) as error:
+            with forbid_n_plus_one():
+                template.render(Context({'comments': comments}))
+
+        self.assertIn(
+            '6 x SELECT ... FROM "auth_user" WHERE "auth_user"."id" = ?',
+            str(error.exception),
+        )
+        self.assertIn('6 from <unknown source>:2', str(error.exception))
+
+    def test_repeats_are_traced_to_code_lines(self):
+        """Checking if a lookup per row made in Python code is reported
+        with the file and its line."""
+        with self.assertRaises(NPlusOneError) as error:
+            with forbid_n_plus_one(threshold=2):
+                for comment in Comment.objects.all():
+                    comment.author.username
+
+        self.assertIn('core/tests/test_middleware.py', str(error.exception))
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Avtor')
+        Post.objects.create(text='Профилируемый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_requests_get_server_timing(self):
+        """Checking if a sampled request reports its phases."""
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+
+        timing = response['Server-Timing']
+        for phase in ('url;dur=', 'view;dur=', 'sql;dur=', 'template;dur=',
+                      'total;dur='):
+            with self.subTest(phase=phase):
+                self.assertIn(phase, timing)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertIn(f'desc="{record["queries"]} queries"', timing)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_image_variants_are_timed(self):
+        """Checking if looking up the variants of post images is
+        reported, though they are made outside of the request."""
+        Post.objects.create(
+            text='Пост с картинкой',
+            author=ProfilingTests.author,
+            image='posts/picture.jpg',
+        )
+        with self.assertLogs('core.profiling', 'INFO'):
+            response = self.client.get(reverse('posts:index'))
+
+        self.assertIn('thumbnails;dur=', response['Server-Timing'])
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_other_requests_are_not_profiled(self):
+        """Checking if requests left out of the sample are untouched."""
+        response = self.client.get(reverse('posts:index'))
+
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_nested_phases_are_timed_once(self):
+        """Checking if a phase inside a phase of the same name, like an
+        included template, is not counted twice."""
+        with profiled() as profile:
+            with timed('template'):
+                with timed('template'):
+                    pass
+            with timed('sql'):
+                pass
+
+        self.assertEqual(profile.counts, {'template': 1, 'sql': 1})
+
+    def test_timed_without_a_profile_does_nothing(self):
+        """Checking if phases outside of a profile are not collected."""
+        with timed('template'):
+            pass
+
+        self.assertIsNone(active_profile())
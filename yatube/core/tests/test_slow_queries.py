@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+def record(sql, view, duration_ms, plan=('SCAN posts_post',)):
+    return json.dumps({
+        'time': '2026-10-18T12:00:00+00:00', 'view': view, 'path': '/',
+        'duration_ms': duration_ms, 'sql': sql, 'plan': list(plan),
+    })
+
+
+class SlowQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(username='Avtor')
+        Post.objects.create(text='Медленный пост', author=author)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = os.path.join(directory.name, 'slow_queries.log')
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0, QUERY_BUDGETS_STRICT=True)
+    def test_slow_queries_are_logged_with_plans(self):
+        """Checking if slow queries are logged with the view and the
+        plan, and plans do not count against query budgets."""
+        with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            response = self.client.get(reverse('posts:index'))
+
+        self.assertEqual(response.status_code, 200)
+        records = [json.loads(line.getMessage()) for line in logs.records]
+        posts = [
+            record for record in records
+            if 'FROM "posts_post"' in record['sql']
+        ]
+        self.assertTrue(posts)
+        self.assertEqual(posts[0]['view'], 'posts:index')
+        self.assertTrue(posts[0]['plan'])
+        self.assertNotIn('params', posts[0])
+
+    def test_command_sums_up_by_shape(self):
+        """Checking if the command groups the log and its backups by the
+        shape of the queries, the most time taken first."""
+        with open(self.log, 'w', encoding='utf-8') as log:
+            log.write(record(
+                'SELECT * FROM "posts_post" WHERE "id" = 1', 'posts:index', 150
+            ) + '\nnot a record\n')
+        with open(f'{self.log}.1', 'w', encoding='utf-8') as log:
+            log.write(record(
+                'SELECT * FROM "posts_post" WHERE "id" = 2', 'posts:profile',
+                250,
+            ) + '\n')
+            log.write(record(
+                'SELECT * FROM "posts_follow"', 'posts:follow_index', 300,
+                plan=('SCAN posts_follow',),
+            ) + '\n')
+        output = StringIO()
+
+        call_command('slow_queries', log=self.log, stdout=output)
+
+        report = output.getvalue()
+        self.assertIn(
+            '2 x, 400 ms in all, 250 ms at most: '
+            'posts:profile (1), posts:index (1)',
+            report,
+        )
+        self.assertIn('SELECT ... FROM "posts_post" WHERE "id" = ?', report)
+        self.assertIn('| SCAN posts_post', report)
+        self.assertLess(
+            report.index('posts_post'), report.index('posts_follow')
+        )
+        self.assertIn('3 slow queries of 2 shapes', report)
+
+    def test_command_filters_by_view(self):
+        """Checking if the report can be narrowed to one view."""
+        with open(self.log, 'w', encoding='utf-8') as log:
+            log.write(record('SELECT 1', 'posts:index', 150) + '\n')
+        output = StringIO()
+
+        call_command(
+            'slow_queries', log=self.log, view='posts:profile', stdout=output
+        )
+
+        self.assertEqual(output.getvalue(), 'No slow queries\n')
@@ -1,7 +1,11 @@
 from http import HTTPStatus
 
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from .metrics import CONTENT_TYPE, exposition
+
 
 def page_not_found(request, exception):
     return render(
@@ -30,3 +34,9 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=""):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def metrics(request):
+    """Metrics of every process of the site for Prometheus."""
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
@@ -1,8 +1,100 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Q
+
 from .models import Post, Group, Comment, Follow
+from .paginators import EstimatedCountPaginator
+from .search import comment_index, post_index
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """List filter that picks a related object with an autocomplete
+    field, instead of listing every object in the sidebar.
+
+    The admin of the related model must have search_fields.
+    """
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f'{self.field_name}__id__exact'
+        self.rel = model._meta.get_field(self.field_name).remote_field
+        self.admin_site = model_admin.admin_site
+        super().__init__(request, params, model, model_admin)
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+    def choices(self, changelist):
+        field = forms.ModelChoiceField(
+            queryset=self.rel.model._default_manager.all(),
+            widget=AutocompleteSelect(self.rel, self.admin_site),
+            required=False,
+        )
+        yield {
+            'widget': field.widget.render(self.parameter_name, self.value()),
+            'hidden': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, PAGE_VAR)
+            ],
+            'reset_url': changelist.get_query_string(
+                remove=[self.parameter_name]
+            ),
+        }
 
 
-class PostAdmin(admin.ModelAdmin):
+def autocomplete_filter(field_name, title):
+    return type(
+        f'{field_name.title()}Filter',
+        (AutocompleteFilter,),
+        {'field_name': field_name, 'title': title},
+    )
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big to count or scan.
+
+    Totals are estimated, search goes through the FTS5 index of the
+    model when there is one, plus exact matches on exact_search_fields,
+    which should be indexed columns.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_index = None
+    exact_search_fields = ()
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, None).media + (
+            forms.Media(js=['posts/js/autocomplete_filter.js'])
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        matches = None
+        if self.search_index is not None:
+            matches = self.search_index.matches(search_term, self.model)
+        if matches is None:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        condition = Q(search_match=True)
+        for field in self.exact_search_fields:
+            condition |= Q(**{field: search_term.strip()})
+        queryset = queryset.annotate(search_match=matches)
+        return queryset.filter(condition), False
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk',
                     'text',
                     'pub_date',
@@ -10,12 +102,24 @@ class PostAdmin(admin.ModelAdmin):
                     'group',
                     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
+    search_index = post_index
+    exact_search_fields = ('author__username',)
     list_filter = ('pub_date',
                    'group',
+                   autocomplete_filter('author', 'автор'),
                    )
     empty_value_display = '-пусто-'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # every row of the changelist gets a copy of this field, with
+            # a list of choices the groups are read once for all of them
+            field.choices = list(field.choices)
+        return field
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title',
@@ -25,34 +129,37 @@ class GroupAdmin(admin.ModelAdmin):
                     )
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('text',
                     'author',
                     'post',
                     'pub_date',
                     )
+    list_select_related = ('author', 'post')
     search_fields = (
         'text',
-        'group',
-        'author',
+        '=author__username',
     )
+    search_index = comment_index
+    exact_search_fields = ('author__username',)
     list_filter = (
         'pub_date',
-        'author',
+        autocomplete_filter('author', 'автор'),
     )
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user',
                     'author',
                     )
+    list_select_related = ('user', 'author')
     search_fields = (
-        'user',
-        'author',
+        '=user__username',
+        '=author__username',
     )
     list_filter = (
-        'user',
-        'author',
+        autocomplete_filter('user', 'кто подписался'),
+        autocomplete_filter('author', 'на кого подписка'),
     )
 
 
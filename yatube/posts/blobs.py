@@ -0,0 +1,65 @@
+"""Reference counts of post images kept by ContentAddressedStorage.
+
+Identical uploads share one blob, so a file can not be deleted with
+the post that dropped it. Signals add a reference when a post takes an
+image and drop one when the post loses it, and the blob goes away with
+its thumbnails once the transaction that dropped the last reference
+commits.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .models import MediaBlob, Post
+from .storage import post_images_storage
+
+logger = logging.getLogger(__name__)
+
+
+def add_ref(name):
+    blobs = MediaBlob.objects.filter(name=name)
+    if not blobs.update(refs=F('refs') + 1):
+        MediaBlob.objects.get_or_create(name=name)
+        blobs.update(refs=F('refs') + 1)
+
+
+def drop_ref(name):
+    blobs = MediaBlob.objects.filter(name=name)
+    blobs.update(refs=Greatest(F('refs') - 1, 0))
+    deleted, _ = blobs.filter(refs=0).delete()
+    if deleted:
+        transaction.on_commit(lambda: free_blob(name))
+
+
+def free_blob(name):
+    """Delete a blob and its thumbnails unless it is used again."""
+    # another post may have uploaded the same picture in the meantime
+    if MediaBlob.objects.filter(name=name).exists():
+        return
+    try:
+        delete_with_thumbnails(ImageFile(name, post_images_storage))
+    except Exception:
+        logger.exception('Image %s was not deleted', name)
+
+
+def recount_refs(batch_size):
+    """Count references of every stored image anew, for posts written
+    without signals. Returns the amount of images."""
+    images = Post.objects.exclude(image='').order_by().values(
+        'image'
+    ).annotate(refs=Count('pk')).values_list('image', 'refs')
+    MediaBlob.objects.all().delete()
+    batch = []
+    done = 0
+    for name, refs in images.iterator(chunk_size=batch_size):
+        batch.append(MediaBlob(name=name, refs=refs))
+        if len(batch) >= batch_size:
+            MediaBlob.objects.bulk_create(batch)
+            done += len(batch)
+            batch = []
+    MediaBlob.objects.bulk_create(batch)
+    return done + len(batch)
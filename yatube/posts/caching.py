@@ -0,0 +1,67 @@
+"""Versioned cache of feed pages.
+
+Every feed has a version token which is a part of its fragment cache
+keys. Changing a post or a comment replaces the tokens of the feeds it
+is shown in, so fragments are cached for hours and still never serve
+a stale page: the next render simply misses the cache.
+
+Follow feeds of a pushed author's followers are bumped one by one. A
+pulled author has too many followers for that, so the follow feed
+version of a user also takes in the profile versions of the pulled
+authors they follow.
+"""
+import hashlib
+from collections import namedtuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+FeedCache = namedtuple('FeedCache', ('timeout', 'version'))
+
+
+def feed_version_key(feed, pk=None):
+    return f'feed_version:{feed}:{pk}'
+
+
+def feed_cache(feed, pk=None):
+    """Timeout and current version for the fragment cache of a feed."""
+    version = cache.get_or_set(
+        feed_version_key(feed, pk), lambda: uuid4().hex, None
+    )
+    return FeedCache(settings.FEED_CACHE_TIMEOUT, version)
+
+
+def follow_feed_cache(user_id, pulled):
+    """Timeout and current version for the fragment cache of a follow
+    feed, given the pulled authors the user follows."""
+    keys = [feed_version_key('follow', user_id)]
+    keys += [feed_version_key('profile', author_id) for author_id in pulled]
+    versions = cache.get_many(keys)
+    missing = {key: uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    version = versions[keys[0]]
+    if pulled:
+        version = hashlib.md5(
+            ':'.join(versions[key] for key in keys).encode()
+        ).hexdigest()
+    return FeedCache(settings.FEED_CACHE_TIMEOUT, version)
+
+
+def bump_feed_versions(author_id, group_ids=(), follower_ids=()):
+    """Invalidate cached pages of the feeds a post is shown in, the
+    follow feeds of follower_ids included."""
+    keys = [feed_version_key('index'), feed_version_key('profile', author_id)]
+    keys += [
+        feed_version_key('group', group_id)
+        for group_id in set(group_ids) if group_id
+    ]
+    keys += [feed_version_key('follow', user_id) for user_id in follower_ids]
+    cache.set_many({key: uuid4().hex for key in keys}, None)
+
+
+def bump_follow_version(user_id):
+    """Invalidate cached follow feed pages of one user."""
+    cache.set(feed_version_key('follow', user_id), uuid4().hex, None)
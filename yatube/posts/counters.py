@@ -0,0 +1,89 @@
+"""Denormalized counters of posts, comments and subscriptions.
+
+Views change the counters with F() expressions right where rows are
+created or deleted, so pages read totals instead of running COUNT.
+The recount_counters command rebuilds them from scratch.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, UserCounters
+
+User = get_user_model()
+
+
+def change_user_counters(user_id, **deltas):
+    """Add deltas to counters of a user, e.g. posts_count=1."""
+    changes = {
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    }
+    counters = UserCounters.objects.filter(user=user_id)
+    if not counters.update(**changes):
+        UserCounters.objects.get_or_create(user_id=user_id)
+        counters.update(**changes)
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0)
+    )
+
+
+def counters_for(user_id):
+    """Counters of a user, zeros for a user who has none yet."""
+    counters = UserCounters.objects.filter(user=user_id).first()
+    return counters or UserCounters(user_id=user_id)
+
+
+def count_of(model, field):
+    """Subquery counting rows of a model which point to the outer row."""
+    rows = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk'))
+    return Coalesce(Subquery(rows.values('total')), 0)
+
+
+def recount_comments(batch_size):
+    """Recount comments of every post, return the amount of posts."""
+    posts = Post.objects.order_by().annotate(
+        total=count_of(Comment, 'post')
+    ).only('pk', 'comments_count')
+    batch = []
+    done = 0
+    for post in posts.iterator(chunk_size=batch_size):
+        post.comments_count = post.total
+        batch.append(post)
+        if len(batch) >= batch_size:
+            Post.objects.bulk_update(batch, ['comments_count'])
+            done += len(batch)
+            batch = []
+    Post.objects.bulk_update(batch, ['comments_count'])
+    return done + len(batch)
+
+
+def recount_users(batch_size):
+    """Rebuild counters of every user, return the amount of users."""
+    users = User.objects.order_by().annotate(
+        posts_total=count_of(Post, 'author'),
+        followers_total=count_of(Follow, 'author'),
+        following_total=count_of(Follow, 'user'),
+    ).values_list('pk', 'posts_total', 'followers_total', 'following_total')
+    UserCounters.objects.all().delete()
+    batch = []
+    done = 0
+    for user_id, posts, followers, following in users.iterator(
+            chunk_size=batch_size):
+        batch.append(UserCounters(
+            user_id=user_id,
+            posts_count=posts,
+            followers_count=followers,
+            following_count=following,
+        ))
+        if len(batch) >= batch_size:
+            UserCounters.objects.bulk_create(batch)
+            done += len(batch)
+            batch = []
+    UserCounters.objects.bulk_create(batch)
+    return done + len(batch)
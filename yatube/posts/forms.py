@@ -1,6 +1,7 @@
 from django import forms
 
 from .models import Post, Comment
+from .uploads import clean_upload
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +9,9 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ['text', 'group', 'image', ]
 
+    def clean_image(self):
+        return clean_upload(self.cleaned_data['image'])
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,146 @@
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail import delete as delete_with_thumbnails
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts.models import MediaBlob, Post
+from posts.storage import post_images_storage
+
+IMAGES_DIR = Post._meta.get_field('image').upload_to
+
+
+def walk_files(path):
+    """Yield DirEntry of every file under path, one directory open at
+    a time per level, so memory does not grow with the amount of
+    files."""
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+class Command(BaseCommand):
+    help = (
+        'Find post images and thumbnails under MEDIA_ROOT that nothing '
+        'refers to any more, and delete them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report orphans, delete nothing.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='How many files to check in one query.',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help=(
+                'Skip files modified less than this many seconds ago, '
+                'they may belong to a post that is being saved.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+        self.newest = time.time() - options['min_age']
+        self.scanned = self.scanned_bytes = 0
+        self.orphans = self.orphan_bytes = 0
+        started = time.monotonic()
+        # originals go first: deleting one deletes its thumbnails too
+        for prefix, check in (
+                (IMAGES_DIR, self.orphan_images),
+                (sorl_settings.THUMBNAIL_PREFIX, self.orphan_thumbnails)):
+            files = walk_files(os.path.join(settings.MEDIA_ROOT, prefix))
+            for batch in batches(files, options['batch_size']):
+                self.collect(batch, check)
+        elapsed = max(time.monotonic() - started, 1e-6)
+        verb = 'Found' if self.dry_run else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {self.scanned} files '
+            f'({self.scanned_bytes / 1024 ** 2:.1f} MB) '
+            f'in {elapsed:.1f} s, {self.scanned / elapsed:.0f} files/s. '
+            f'{verb} {self.orphans} orphans '
+            f'({self.orphan_bytes / 1024 ** 2:.1f} MB).'
+        ))
+
+    def collect(self, batch, check):
+        """Check a batch of files and delete, or report, its orphans."""
+        names = {}
+        for entry in batch:
+            stat = entry.stat(follow_symlinks=False)
+            self.scanned += 1
+            self.scanned_bytes += stat.st_size
+            if stat.st_mtime > self.newest:
+                continue
+            name = os.path.relpath(entry.path, settings.MEDIA_ROOT)
+            names[name.replace(os.sep, '/')] = stat.st_size
+        for name in check(list(names)):
+            self.orphans += 1
+            self.orphan_bytes += names[name]
+            if self.verbosity >= 2:
+                self.stdout.write(name)
+            if not self.dry_run:
+                self.delete(name)
+
+    def orphan_images(self, names):
+        used = set(
+            Post.objects.filter(
+                image__in=names
+            ).values_list('image', flat=True)
+        )
+        return [name for name in names if name not in used]
+
+    def orphan_thumbnails(self, names):
+        keys = {
+            add_prefix(ImageFile(name, default.storage).key): name
+            for name in names
+        }
+        known = set(
+            KVStoreModel.objects.filter(
+                key__in=list(keys)
+            ).values_list('key', flat=True)
+        )
+        return [name for key, name in keys.items() if key not in known]
+
+    def delete(self, name):
+        if name.startswith(IMAGES_DIR):
+            MediaBlob.objects.filter(name=name).delete()
+            # images saved before ContentAddressedStorage have their
+            # thumbnails recorded for the default storage
+            default.kvstore.delete_thumbnails(
+                ImageFile(name, default_storage)
+            )
+            delete_with_thumbnails(ImageFile(name, post_images_storage))
+        else:
+            default.storage.delete(name)
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from posts.timeline import timeline_posts
+from posts.views import POSTS_DSPL
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Show EXPLAIN QUERY PLAN of the feed queries without and with '
+        'the composite indexes of the posts app.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN is SQLite only')
+        queries = self.feed_queries()
+        try:
+            with transaction.atomic():
+                self.drop_indexes()
+                self.explain('before', queries)
+                raise Rollback
+        except Rollback:
+            pass
+        self.explain('after', queries)
+
+    def feed_queries(self):
+        """Querysets the feed views run, on the busiest rows."""
+        group = Group.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        author = User.objects.annotate(
+            total=Count('posts')
+        ).order_by('-total').first()
+        reader = User.objects.annotate(
+            total=Count('follower')
+        ).order_by('-total').first()
+        post = Post.objects.annotate(
+            total=Count('comments')
+        ).order_by('-total').first()
+        if None in (group, author, reader, post):
+            raise CommandError('Not enough data to explain feeds')
+        return {
+            'index': Post.objects.feed()[:POSTS_DSPL],
+            'group_list': group.posts.feed()[:POSTS_DSPL],
+            'profile': author.posts.feed()[:POSTS_DSPL],
+            'profile following': Follow.objects.filter(
+                user=reader, author=author
+            ),
+            'follow_index': timeline_posts(reader)[:POSTS_DSPL],
+            'post_detail comments': post.comments.all(),
+        }
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (Post, Comment, Follow, TimelineEntry):
+                for index in model._meta.indexes:
+                    cursor.execute(f'DROP INDEX "{index.name}"')
+
+    def explain(self, title, queries):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{title}:'))
+        with connection.cursor() as cursor:
+            for name, queryset in queries.items():
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                self.stdout.write(f'  {name}')
+                for row in cursor.fetchall():
+                    self.stdout.write(f'    {row[-1]}')
@@ -0,0 +1,208 @@
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts import synthetic
+from posts.models import Comment, Follow, Group, Post
+from posts.snapshots import keep_dates, rebuild_derived, reset_sequences
+from posts.storage import post_images_storage
+
+User = get_user_model()
+
+MODELS = {
+    'groups': Group,
+    'users': User,
+    'posts': Post,
+    'comments': Comment,
+    'follows': Follow,
+}
+IMAGES_DIR = Post._meta.get_field('image').upload_to
+
+
+def in_order(executor, function, items, window):
+    """Like executor.map, but with at most window items in work, so
+    results do not pile up while the caller is still writing."""
+    running = deque()
+    for item in items:
+        running.append(executor.submit(function, item))
+        if len(running) >= window:
+            yield running.popleft().result()
+    while running:
+        yield running.popleft().result()
+
+
+def batches(results, batch_size):
+    """Regroup (kind, rows) results into batches of batch_size rows,
+    one kind to a batch, in the order of the results."""
+    kind, batch = None, []
+    for result_kind, rows in results:
+        if result_kind != kind and batch:
+            yield kind, batch
+            batch = []
+        kind = result_kind
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield kind, batch
+                batch = []
+    if batch:
+        yield kind, batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a seeded synthetic dataset of users, groups, posts, '
+        'comments and subscriptions for load tests.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in (('users', 1000), ('groups', 20),
+                              ('posts', 10000), ('comments', 20000)):
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                default=default,
+                help=f'How many {name} to make.',
+            )
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Mean amount of subscriptions of a user.',
+        )
+        parser.add_argument(
+            '--images',
+            type=float,
+            default=0,
+            help='Share of posts with a picture, from 0 to 1.',
+        )
+        parser.add_argument(
+            '--pictures',
+            type=int,
+            default=20,
+            help='How many distinct pictures the posts share.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--end-date',
+            type=date.fromisoformat,
+            default=timezone.localdate(),
+            help=(
+                'Day the newest post is written on, YYYY-MM-DD, today by '
+                'default. Pass it to make the same dataset on another day.'
+            ),
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='How many days the posts are spread over.',
+        )
+        parser.add_argument(
+            '--password',
+            help='Password of every user, by default they can not log in.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Processes that make rows, 1 makes them in this one.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='How many rows to write in one transaction.',
+        )
+
+    def handle(self, *args, **options):
+        if options['posts'] and not options['users']:
+            raise CommandError('Posts need users to be written by.')
+        if options['comments'] and not options['posts']:
+            raise CommandError('Comments need posts to be left on.')
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images must be from 0 to 1.')
+        self.verbosity = options['verbosity']
+        self.started = time.monotonic()
+        self.written = Counter()
+        plan = self.make_plan(options)
+        # one hash for every user, hashing millions takes hours
+        self.password = make_password(options['password'])
+        batch_size = options['batch_size']
+        # chunks are cut by the dataset, not by the batches, or another
+        # batch size would give other rows
+        tasks = synthetic.tasks(plan)
+        if options['workers'] > 1:
+            with ProcessPoolExecutor(options['workers']) as executor:
+                self.write(batches(in_order(
+                    executor, synthetic.make_rows, tasks,
+                    options['workers'] * 2,
+                ), batch_size))
+        else:
+            self.write(batches(map(synthetic.make_rows, tasks), batch_size))
+        reset_sequences(list(MODELS.values()))
+        rebuild_derived(batch_size, self.stdout)
+        for kind, total in self.written.items():
+            self.stdout.write(f'{kind}\t{total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {sum(self.written.values())} rows '
+            f'in {time.monotonic() - self.started:.1f} s'
+        ))
+
+    def make_plan(self, options):
+        end = timezone.make_aware(
+            datetime.combine(options['end_date'], datetime.max.time())
+        )
+        return synthetic.Plan(
+            seed=options['seed'],
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            # new rows go after the ones already in the database
+            first_user=User.objects.aggregate(last=Max('pk'))['last'] or 0,
+            first_group=Group.objects.aggregate(last=Max('pk'))['last'] or 0,
+            first_post=Post.objects.aggregate(last=Max('pk'))['last'] or 0,
+            start=end - timedelta(days=options['days']),
+            end=end,
+            images=self.store_pictures(options) if options['images'] else (),
+            with_image=options['images'],
+        )
+
+    def store_pictures(self, options):
+        """Store the pictures posts share and return their names."""
+        return tuple(
+            post_images_storage.save(
+                f'{IMAGES_DIR}synthetic.jpg',
+                ContentFile(synthetic.draw_picture(options['seed'], index)),
+            )
+            for index in range(options['pictures'])
+        )
+
+    def write(self, results):
+        for kind, rows in results:
+            model = MODELS[kind]
+            if model is User:
+                for row in rows:
+                    row['password'] = self.password
+            with transaction.atomic(), keep_dates(model):
+                model.objects.bulk_create(model(**row) for row in rows)
+            self.written[kind] += len(rows)
+            if self.verbosity >= 2:
+                total = sum(self.written.values())
+                elapsed = max(time.monotonic() - self.started, 1e-6)
+                self.stdout.write(
+                    f'{kind}: {self.written[kind]}, '
+                    f'{total / elapsed:.0f} rows/s'
+                )
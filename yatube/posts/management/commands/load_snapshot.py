@@ -0,0 +1,71 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.snapshots import SnapshotLoader, rebuild_derived
+
+
+class Command(BaseCommand):
+    help = (
+        'Load groups, users, posts, comments and follows from a dumpdata '
+        'JSON snapshot of any size, streaming it in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshot', help='Path to the JSON snapshot.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='How many rows to write in one transaction.',
+        )
+        parser.add_argument(
+            '--ignore-conflicts',
+            action='store_true',
+            help='Skip rows whose id is already in the database.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['snapshot']
+        batch_size = options['batch_size']
+        try:
+            self.size = os.path.getsize(path)
+            snapshot = open(path, encoding='utf-8')
+        except OSError as error:
+            raise CommandError(f'Can not read {path}: {error}')
+        self.started = time.monotonic()
+        self.verbosity = options['verbosity']
+        loader = SnapshotLoader(
+            batch_size, options['ignore_conflicts'], self.report
+        )
+        with snapshot:
+            self.snapshot = snapshot
+            try:
+                loader.load(snapshot)
+            except ValueError as error:
+                raise CommandError(f'Broken snapshot: {error}')
+        rebuild_derived(batch_size, self.stdout)
+        for label, total in loader.loaded.items():
+            self.stdout.write(f'{label}\t{total}')
+        for label, total in loader.skipped.items():
+            self.stdout.write(f'{label}\t{total} skipped')
+        for label, total in loader.invalid.items():
+            self.stderr.write(
+                f'{label}\t{total} without parent rows, not loaded'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {sum(loader.loaded.values())} rows '
+            f'in {time.monotonic() - self.started:.1f} s'
+        ))
+
+    def report(self, loader):
+        if self.verbosity < 2:
+            return
+        # the position of the raw file is ahead of the decoder by a chunk
+        done = self.snapshot.buffer.tell() / max(self.size, 1)
+        rows = sum(loader.loaded.values())
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        self.stdout.write(
+            f'{done:.0%} read, {rows} rows, {rows / elapsed:.0f} rows/s'
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized home timelines from subscriptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='How many timelines to rebuild in one query.',
+        )
+
+    def handle(self, *args, **options):
+        TimelineEntry.objects.all().delete()
+        pulled = list(timeline.popular_authors())
+        users = Follow.objects.order_by('user').values_list(
+            'user', flat=True
+        ).distinct()
+        batch = []
+        total = 0
+        for user_id in users.iterator():
+            batch.append(user_id)
+            if len(batch) >= options['batch_size']:
+                timeline.rebuild(batch, pulled)
+                total += len(batch)
+                batch = []
+        if batch:
+            timeline.rebuild(batch, pulled)
+        self.stdout.write(self.style.SUCCESS(
+            f'Timelines of {total + len(batch)} users rebuilt'
+        ))
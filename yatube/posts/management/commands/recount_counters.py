@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_comments, recount_users
+
+
+class Command(BaseCommand):
+    help = 'Recount denormalized post, comment and follower counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='How many rows to write in one query.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            posts = recount_comments(batch_size)
+            users = recount_users(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted counters of {posts} posts and {users} users'
+        ))
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Show which authors are pushed into followers\' timelines '
+        'and which are pulled at read time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=int,
+            default=settings.TIMELINE_PUSH_THRESHOLD,
+            help='Followers count from which an author is pulled.',
+        )
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        authors = User.objects.annotate(
+            followers=Count('following')
+        ).filter(followers__gt=0).order_by('-followers', 'username')
+        pushed = pulled = 0
+        for author in authors.values_list('username', 'followers'):
+            username, followers = author
+            if followers >= threshold:
+                mode = 'pull'
+                pulled += 1
+            else:
+                mode = 'push'
+                pushed += 1
+            self.stdout.write(f'{mode}\t{followers}\t{username}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Threshold {threshold}: {pushed} pushed, {pulled} pulled'
+        ))
@@ -0,0 +1,14 @@
+"""Metrics of posts, reported with the rest of core.metrics."""
+from core.metrics import Counter, Histogram
+
+# thumbnail generation, in seconds
+THUMBNAIL_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+POSTS_CREATED = Counter('yatube_posts_created', 'Posts written.')
+COMMENTS_CREATED = Counter('yatube_comments_created', 'Comments left.')
+FOLLOWS_CREATED = Counter('yatube_follows_created', 'Subscriptions made.')
+THUMBNAILS = Histogram(
+    'yatube_thumbnail_seconds',
+    'Time to get a thumbnail of a post image, made or found ready.',
+    THUMBNAIL_BUCKETS,
+)
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:36
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_comment_search'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='timelineentry',
+            options={'ordering': ['-pub_date', '-post_id'], 'verbose_name': 'запись ленты', 'verbose_name_plural': 'записи ленты'},
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from pytils.translit import slugify
 
 from core.models import CreatedModel
+from .storage import post_images_storage
 
 User = get_user_model()
 
@@ -27,6 +28,25 @@ class Group(models.Model):
         verbose_name_plural = 'группы'
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Posts prepared for feed pages.
+
+        Authors and groups come in the same query, columns that list
+        templates never show are left out.
+        """
+        return self.select_related('author', 'group').defer(
+            'author__password',
+            'author__last_login',
+            'author__is_superuser',
+            'author__email',
+            'author__is_staff',
+            'author__is_active',
+            'author__date_joined',
+            'group__description',
+        )
+
+
 class Post(CreatedModel):
     text = models.TextField(
         verbose_name='текст поста',
@@ -50,12 +70,36 @@ class Post(CreatedModel):
     image = models.ImageField(
         verbose_name='картинка',
         upload_to='posts/',
+        storage=post_images_storage,
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='количество комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta(CreatedModel.Meta):
         verbose_name = 'пост'
         verbose_name_plural = 'посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_date_idx',
+            ),
+            # lets clean_media look up stored files by name
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
 
 class Comment(CreatedModel):
@@ -80,6 +124,12 @@ class Comment(CreatedModel):
     class Meta(CreatedModel.Meta):
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', '-pub_date'],
+                name='comment_post_date_idx',
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -99,3 +149,107 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'подписка'
         verbose_name_plural = 'подписки'
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow',
+            ),
+        ]
+
+
+class UserCounters(models.Model):
+    """Denormalized totals of a user, kept by posts.counters."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='количество постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='количество подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='количество подписок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'счётчики пользователя'
+        verbose_name_plural = 'счётчики пользователей'
+
+
+class MediaBlob(models.Model):
+    """A stored post image and the number of posts that use it."""
+    name = models.CharField(
+        verbose_name='имя файла',
+        max_length=255,
+        primary_key=True,
+    )
+    refs = models.PositiveIntegerField(
+        verbose_name='количество ссылок',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'файл картинки'
+        verbose_name_plural = 'файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+
+class TimelineEntry(models.Model):
+    """A post in the home timeline of one of its author's followers."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='владелец ленты',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='автор поста',
+    )
+    # copy of post's pub_date, so the timeline is read by a single index
+    pub_date = models.DateTimeField(verbose_name='дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date', '-post_id']
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи ленты'
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        ]
@@ -0,0 +1,242 @@
+import base64
+import binascii
+
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+CURSOR_PARAM = 'cursor'
+# how long a feed total lives in cache, signals drop it earlier on change
+FEED_COUNT_TIMEOUT = 60 * 60
+# how many page links to show on each side of the current page
+PAGE_WINDOW = 2
+# cursor directions: towards older posts and towards newer posts
+NEXT = 'n'
+PREVIOUS = 'p'
+# a filtered admin changelist stops counting rows after this many
+COUNT_LIMIT = 10000
+
+
+def encode_cursor(direction, post):
+    """Pack the feed position of a post into an opaque url-safe token."""
+    raw = f'{direction}|{post.pub_date.isoformat()}|{post.pk}'
+    token = base64.urlsafe_b64encode(raw.encode())
+    return token.decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Unpack a token made by encode_cursor.
+
+    Raises ValueError for anything that is not a valid token.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError(f'Invalid cursor: {token!r}')
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        raise ValueError(f'Invalid cursor: {token!r}')
+    return direction, pub_date, pk
+
+
+def feed_count_key(feed, pk=None):
+    """Cache key of the total amount of posts in a feed."""
+    return f'feed_count:{feed}:{pk}'
+
+
+class FeedPaginator(Paginator):
+    """Paginator that keeps the total of its feed in cache.
+
+    The total is counted once and then served from cache until a post
+    or a subscription that changes the feed drops it, so a page request
+    does not run SELECT COUNT(*) every time.
+    """
+    window = PAGE_WINDOW
+
+    def __init__(self, object_list, per_page, count_key=None):
+        super().__init__(object_list, per_page)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        if self.count_key is None:
+            return super().count
+        count = cache.get(self.count_key)
+        if count is None:
+            count = super().count
+            cache.set(self.count_key, count, FEED_COUNT_TIMEOUT)
+        return count
+
+    def get_page_window(self, number):
+        """Return the numbers of pages to link around the given one."""
+        first = max(number - self.window, 1)
+        last = min(number + self.window, self.num_pages)
+        return range(first, last + 1)
+
+
+def estimate_rows(model, using):
+    """Guess the amount of rows of a table without counting them.
+
+    Uses the planner statistics of the database when there are any and
+    the largest id otherwise. Returns None when nothing is known.
+    """
+    table = model._meta.db_table
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [table],
+            )
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return int(row[0])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone():
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table]
+                )
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+    # ids only grow, so the largest one is a cheap upper bound
+    return model._default_manager.using(using).aggregate(
+        largest=Max('pk')
+    )['largest']
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator for admin changelists of big tables.
+
+    An unfiltered changelist takes the total from estimate_rows, a
+    filtered one counts matching rows up to COUNT_LIMIT, so no page of
+    the admin runs COUNT(*) over the whole table.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset.model, queryset.db)
+            if estimate is not None:
+                return estimate
+        return queryset.order_by()[:COUNT_LIMIT].count()
+
+
+class CursorPage(Page):
+    """A page of a keyset-paginated feed.
+
+    Knows nothing about its number or the total amount of pages,
+    only about its neighbours.
+    """
+    cursor_mode = True
+
+    def __init__(self, object_list, paginator, cursor='',
+                 has_next=False, has_previous=False):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<Page after cursor {self.cursor!r}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_cursor(NEXT, self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_cursor(PREVIOUS, self.object_list[0])
+
+
+class CursorPaginator(FeedPaginator):
+    """Keyset paginator over (pub_date, id) of a posts queryset.
+
+    Every page is fetched with an indexed range condition instead of
+    OFFSET, so a deep page costs the same as the first one.
+    """
+    ordering = ('-pub_date', '-pk')
+
+    def __init__(self, object_list, per_page, count_key=None):
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, count_key
+        )
+
+    def get_cursor_page(self, cursor):
+        """Return the page addressed by a cursor token.
+
+        An empty or broken token gives the first page, the same way
+        Paginator.get_page forgives a wrong page number.
+        """
+        try:
+            direction, pub_date, pk = decode_cursor(cursor or '')
+        except ValueError:
+            return self._first_page()
+        if direction == PREVIOUS:
+            return self._page_before(cursor, pub_date, pk)
+        return self._page_after(cursor, pub_date, pk)
+
+    def _first_page(self):
+        posts = list(self.object_list[:self.per_page + 1])
+        return CursorPage(
+            posts[:self.per_page], self,
+            has_next=len(posts) > self.per_page,
+        )
+
+    def _page_after(self, cursor, pub_date, pk):
+        older = self.object_list.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+        )
+        posts = list(older[:self.per_page + 1])
+        return CursorPage(
+            posts[:self.per_page], self, cursor,
+            has_next=len(posts) > self.per_page,
+            has_previous=True,
+        )
+
+    def _page_before(self, cursor, pub_date, pk):
+        newer = self.object_list.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+        ).reverse()
+        posts = list(newer[:self.per_page + 1])
+        if not posts:
+            return self._first_page()
+        return CursorPage(
+            posts[:self.per_page][::-1], self, cursor,
+            has_next=True,
+            has_previous=len(posts) > self.per_page,
+        )
+
+
+def paginate(request, posts, per_page, count_key=None):
+    """Return the requested page of a posts feed.
+
+    `?cursor=` switches the feed to keyset mode, otherwise the feed is
+    split into classic numbered pages by `?page=`, with the feed total
+    cached under count_key.
+    """
+    if CURSOR_PARAM in request.GET:
+        paginator = CursorPaginator(posts, per_page, count_key)
+        return paginator.get_cursor_page(request.GET.get(CURSOR_PARAM))
+    paginator = FeedPaginator(posts, per_page, count_key)
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1,194 @@
+"""Full-text search over posts and comments.
+
+On SQLite the text of every post and comment is copied into an FTS5
+table whose rowid is the row's id, so a query is answered by the
+inverted index, ranked with bm25 and shown with a highlighted snippet.
+Signals keep the tables in sync with the text of the rows. Other
+databases fall back to a plain icontains filter.
+"""
+import base64
+import binascii
+import re
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+# words around a match shown in a snippet
+SNIPPET_WORDS = 16
+# markers of matches in a snippet, they never occur in post texts
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+class SearchIndex:
+    """An FTS5 table with the text of one model, by the model's ids."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def add(self, obj):
+        if is_available():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT OR REPLACE INTO {self.table} (rowid, text) '
+                    f'VALUES (%s, %s)',
+                    [obj.pk, obj.text],
+                )
+
+    def remove(self, pk):
+        if is_available():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self.table} WHERE rowid = %s', [pk]
+                )
+
+    def rebuild(self, model):
+        """Fill the table anew from every row of model, for rows that
+        were written without signals, like by bulk_create."""
+        if is_available():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {self.table}')
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, text) '
+                    f'SELECT {model._meta.pk.column}, text '
+                    f'FROM {model._meta.db_table}'
+                )
+
+    def matches(self, query, model):
+        """Boolean expression telling if a row of model matches query,
+        to be annotated and filtered on.
+
+        None when there is nothing to search or no index to search in.
+        """
+        match = match_query(query)
+        if match is None or not is_available():
+            return None
+        pk = f'"{model._meta.db_table}"."{model._meta.pk.column}"'
+        return RawSQL(
+            f'{pk} IN (SELECT rowid FROM {self.table} '
+            f'WHERE {self.table} MATCH %s)',
+            [match],
+            output_field=BooleanField(),
+        )
+
+
+post_index = SearchIndex('posts_post_search')
+comment_index = SearchIndex('posts_comment_search')
+
+
+def match_query(query):
+    """Turn what a user typed into an FTS5 query.
+
+    Every word becomes a quoted prefix term, so the query syntax of FTS5
+    can not be injected and 'поиск' also finds 'поиска'. Returns None
+    for a query without words.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def encode_cursor(rank, pk):
+    raw = f'{rank!r}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Unpack a token made by encode_cursor, None for a broken one."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        rank, pk = raw.split('|')
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def highlight(snippet):
+    """Escape a snippet and wrap its matches in <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MATCH_START, '<mark>')
+        .replace(MATCH_END, '</mark>')
+    )
+
+
+class SearchPage:
+    """One page of search results and the cursor of the next one."""
+
+    def __init__(self, posts, next_cursor=None):
+        self.object_list = posts
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def search_posts(query, cursor='', per_page=10):
+    """Return a page of posts matching query, best matches first.
+
+    Pages are keyset-paginated by (rank, id): the cursor holds the rank
+    and id of the last post of the previous page.
+    """
+    match = match_query(query)
+    if match is None:
+        return SearchPage([])
+    if not is_available():
+        return _search_by_like(query, cursor, per_page)
+    table = post_index.table
+    sql = (
+        f'SELECT rowid, rank, snippet({table}, 0, %s, %s, %s, %s) '
+        f'FROM {table} WHERE {table} MATCH %s'
+    )
+    params = [MATCH_START, MATCH_END, '…', SNIPPET_WORDS, match]
+    after = decode_cursor(cursor or '')
+    if after is not None:
+        rank, pk = after
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [rank, rank, pk]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    found = Post.objects.feed().in_bulk([row[0] for row in rows[:per_page]])
+    posts = []
+    for pk, rank, snippet in rows[:per_page]:
+        # a post deleted since the query ran is skipped
+        if pk in found:
+            found[pk].snippet = highlight(snippet)
+            posts.append(found[pk])
+    next_cursor = None
+    if len(rows) > per_page:
+        pk, rank, _ = rows[per_page - 1]
+        next_cursor = encode_cursor(rank, pk)
+    return SearchPage(posts, next_cursor)
+
+
+def _search_by_like(query, cursor, per_page):
+    """Search without an inverted index, newest matches first."""
+    posts = Post.objects.feed().filter(text__icontains=query.strip())
+    after = decode_cursor(cursor or '')
+    if after is not None:
+        posts = posts.filter(pk__lt=after[1])
+    posts = list(posts.order_by('-pk')[:per_page + 1])
+    next_cursor = None
+    if len(posts) > per_page:
+        next_cursor = encode_cursor(0.0, posts[per_page - 1].pk)
+    return SearchPage(posts[:per_page], next_cursor)
@@ -0,0 +1,114 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import blobs, search, timeline
+from .caching import bump_feed_versions, bump_follow_version
+from .metrics import COMMENTS_CREATED, FOLLOWS_CREATED, POSTS_CREATED
+from .models import Comment, Follow, Post
+from .paginators import feed_count_key
+from .thumbnails import schedule_thumbnails
+
+
+def drop_feed_counts(post):
+    """Forget cached totals of every feed the post belongs to, follow
+    feeds are counted by their version."""
+    cache.delete_many([
+        feed_count_key('index'),
+        feed_count_key('profile', post.author_id),
+        feed_count_key('group', post.group_id),
+    ])
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    # editing may move a post to another group, the old one loses it,
+    # or replace its image, the new one needs thumbnails
+    if instance.pk:
+        old = Post.objects.filter(
+            pk=instance.pk
+        ).values('group', 'image').first() or {}
+        instance._old_group_id = old.get('group')
+        instance._old_image = old.get('image')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    old_group_id = getattr(instance, '_old_group_id', None)
+    followers = timeline.pushed_followers(instance.author_id)
+    bump_feed_versions(
+        instance.author_id, (instance.group_id, old_group_id), followers
+    )
+    search.post_index.add(instance)
+    old_image = getattr(instance, '_old_image', None)
+    if instance.image.name != old_image:
+        if instance.image:
+            blobs.add_ref(instance.image.name)
+            schedule_thumbnails(instance.image.name)
+        if old_image:
+            blobs.drop_ref(old_image)
+    if created:
+        POSTS_CREATED.inc()
+        timeline.push_post(instance, followers)
+        drop_feed_counts(instance)
+    elif old_group_id != instance.group_id:
+        cache.delete_many([
+            feed_count_key('group', group_id)
+            for group_id in (old_group_id, instance.group_id) if group_id
+        ])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_feed_versions(
+        instance.author_id, (instance.group_id,),
+        timeline.pushed_followers(instance.author_id),
+    )
+    drop_feed_counts(instance)
+    search.post_index.remove(instance.pk)
+    if instance.image:
+        blobs.drop_ref(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    post = Post.objects.filter(
+        pk=instance.post_id
+    ).values('author', 'group').first()
+    # nothing to refresh if the post itself is gone already
+    if post is not None:
+        bump_feed_versions(
+            post['author'], (post['group'],),
+            timeline.pushed_followers(post['author']),
+        )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    search.comment_index.add(instance)
+    if created:
+        COMMENTS_CREATED.inc()
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    search.comment_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    bump_follow_version(instance.user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        FOLLOWS_CREATED.inc()
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
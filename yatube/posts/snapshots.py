@@ -0,0 +1,255 @@
+"""Streaming loader of database snapshots in the dumpdata JSON format.
+
+loaddata reads a whole fixture into memory and saves objects one by
+one. Here the top-level array is decoded object by object from chunks
+of the file, and objects are written with bulk_create in batches, one
+transaction per batch, so memory stays flat however big the snapshot.
+
+Before a batch is written, its foreign keys are checked against the
+database with one query per relation. A snapshot does not have to list
+parents before children, so rows whose parents are not loaded yet are
+spilled to a temporary file and retried once the whole snapshot has
+been read, parents first.
+"""
+import json
+import re
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import connection, transaction
+
+from .blobs import recount_refs
+from .counters import recount_comments, recount_users
+from .models import Comment, Post
+from .search import comment_index, post_index
+
+# models a snapshot is loaded into, parents before children
+MODELS = (
+    'posts.group',
+    settings.AUTH_USER_MODEL.lower(),
+    'posts.post',
+    'posts.comment',
+    'posts.follow',
+)
+CHUNK_SIZE = 1024 * 1024
+MAX_ITEM_SIZE = 64 * 1024 * 1024
+# ids checked in one IN (...) clause
+LOOKUP_BATCH = 500
+WHITESPACE = re.compile(r'\s*')
+
+
+@contextmanager
+def keep_dates(model):
+    """Let bulk_create write the given dates of auto_now_add fields of
+    model, instead of replacing them with the current time."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class ArrayReader:
+    """Read a JSON array from a text stream one item at a time.
+
+    Only about one chunk and the item being decoded are held in memory.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+
+    def read_more(self):
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            raise ValueError('Unexpected end of the snapshot')
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        # a broken item would otherwise pull the rest of the file in
+        if len(self.buffer) > MAX_ITEM_SIZE:
+            raise ValueError('A snapshot item is broken or too big')
+
+    def next_char(self):
+        """Skip whitespace and return the next character."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.read_more()
+
+    def decode(self):
+        # raw_decode does not skip whitespace in front of the item
+        self.next_char()
+        while True:
+            try:
+                item, self.pos = self.decoder.raw_decode(
+                    self.buffer, self.pos
+                )
+                return item
+            except json.JSONDecodeError:
+                # the item goes on in the next chunk
+                self.read_more()
+
+
+def iter_array(stream, chunk_size=CHUNK_SIZE):
+    """Yield the items of a JSON array read from a text stream.
+
+    Raises ValueError when the stream is not a JSON array.
+    """
+    reader = ArrayReader(stream, chunk_size)
+    if reader.next_char() != '[':
+        raise ValueError('A snapshot must be a JSON array')
+    reader.pos += 1
+    if reader.next_char() == ']':
+        return
+    while True:
+        yield reader.decode()
+        char = reader.next_char()
+        reader.pos += 1
+        if char == ']':
+            return
+        if char != ',':
+            raise ValueError(f'Unexpected {char!r} in the snapshot')
+
+
+class SnapshotLoader:
+    """Load a snapshot stream into MODELS.
+
+    Objects of other models are counted as skipped, rows whose parents
+    are not in the database even after the retry are counted as
+    invalid. report, if given, is called with the loader after every
+    written batch.
+    """
+
+    def __init__(self, batch_size=5000, ignore_conflicts=False,
+                 report=None):
+        self.batch_size = batch_size
+        self.ignore_conflicts = ignore_conflicts
+        self.report = report
+        self.pending = {label: [] for label in MODELS}
+        self.spills = {}
+        self.retrying = False
+        self.loaded = Counter()
+        self.skipped = Counter()
+        self.invalid = Counter()
+
+    def load(self, stream):
+        for data in iter_array(stream):
+            label = str(data.get('model', '')).lower()
+            if label in self.pending:
+                self.add(label, data)
+            else:
+                self.skipped[label] += 1
+        for label in MODELS:
+            self.flush(label)
+        self.retry_spilled()
+        reset_sequences([apps.get_model(label) for label in MODELS])
+
+    def add(self, label, data):
+        self.pending[label].append(data)
+        if len(self.pending[label]) >= self.batch_size:
+            self.flush(label)
+
+    def flush(self, label):
+        rows = self.pending[label]
+        if not rows:
+            return
+        self.pending[label] = []
+        model = apps.get_model(label)
+        objects = [
+            deserialized.object
+            for deserialized in Deserializer(rows, ignorenonexistent=True)
+        ]
+        orphans = self.find_orphans(model, objects)
+        with transaction.atomic(), keep_dates(model):
+            model._default_manager.bulk_create(
+                [obj for index, obj in enumerate(objects)
+                 if index not in orphans],
+                ignore_conflicts=self.ignore_conflicts,
+            )
+        self.loaded[label] += len(objects) - len(orphans)
+        for index in sorted(orphans):
+            if self.retrying:
+                self.invalid[label] += 1
+            else:
+                self.spill(label, rows[index])
+        if self.report is not None:
+            self.report(self)
+
+    def find_orphans(self, model, objects):
+        """Indexes of objects whose parent rows are not in the database."""
+        orphans = set()
+        for field in model._meta.concrete_fields:
+            if not (field.many_to_one or field.one_to_one):
+                continue
+            target = field.target_field.attname
+            values = list({
+                getattr(obj, field.attname) for obj in objects
+            } - {None})
+            existing = set()
+            for start in range(0, len(values), LOOKUP_BATCH):
+                existing.update(
+                    field.related_model._default_manager.filter(**{
+                        f'{target}__in': values[start:start + LOOKUP_BATCH]
+                    }).values_list(target, flat=True)
+                )
+            for index, obj in enumerate(objects):
+                value = getattr(obj, field.attname)
+                if value is not None and value not in existing:
+                    orphans.add(index)
+        return orphans
+
+    def spill(self, label, data):
+        if label not in self.spills:
+            self.spills[label] = tempfile.TemporaryFile(
+                'w+', encoding='utf-8'
+            )
+        self.spills[label].write(json.dumps(data) + '\n')
+
+    def retry_spilled(self):
+        self.retrying = True
+        for label in MODELS:
+            spill = self.spills.pop(label, None)
+            if spill is None:
+                continue
+            with spill:
+                spill.seek(0)
+                for line in spill:
+                    self.add(label, json.loads(line))
+            self.flush(label)
+
+
+def reset_sequences(models):
+    """Move id sequences past the ids that were written explicitly."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def rebuild_derived(batch_size, stdout=None):
+    """Refresh data that signals keep, bulk_create sends none."""
+    recount_comments(batch_size)
+    recount_users(batch_size)
+    recount_refs(batch_size)
+    post_index.rebuild(Post)
+    comment_index.rebuild(Comment)
+    call_command('rebuild_timelines', stdout=stdout)
+    # cached pages and feed totals predate the new rows
+    cache.clear()
@@ -0,0 +1,45 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files by the hash of their content.
+
+    A file saved under posts/photo.jpg lands at posts/ab/cd/abcd….jpg,
+    where abcd… is the SHA-256 of its bytes, so identical uploads share
+    one blob and no directory grows past 256 entries of the next level.
+    Blobs are never overwritten or renamed; posts.blobs counts who uses
+    them and deletes a blob nobody uses any more.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def hashed_name(self, name, content):
+        """Return the content-addressed name of a file saved as name."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), hexdigest[:2], hexdigest[2:4],
+            hexdigest + extension,
+        )
+
+
+post_images_storage = ContentAddressedStorage()
@@ -0,0 +1,228 @@
+"""Seeded synthetic datasets for load tests.
+
+Rows are made in chunks, every chunk by its own random generator
+seeded with the seed of the dataset, the kind of rows and the first
+index of the chunk. Chunks are always CHUNK_SIZE rows long, whatever
+batches they are written in. So chunks can be made in any order, in any
+process, and the same seed and plan always give the same rows.
+
+Popularity follows a power law: users with lower indexes are followed,
+write and comment more, newer posts get more comments. Nothing here
+touches the database, so chunks can be made in a process pool without
+Django being set up in the workers.
+"""
+import random
+from collections import namedtuple
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+
+from faker import Faker
+from PIL import Image, ImageDraw
+from pytils.translit import slugify
+
+# a user or post of popularity rank k is picked about (k + 1) ** -s
+# times as often as the first one, so followers are power-law
+# distributed with the exponent 1 + 1 / s
+POPULARITY_EXPONENT = 0.9
+# shape of the Pareto distribution of subscriptions per user
+FOLLOWS_SHAPE = 2
+# mean delay of a comment after its post
+COMMENT_DELAY = timedelta(hours=6)
+# share of posts without a group
+NO_GROUP = 0.3
+PICTURE_SIZE = (1920, 678)
+# rows, or users for subscriptions, made by one generator; changing it
+# changes every dataset
+CHUNK_SIZE = 1000
+
+Plan = namedtuple('Plan', [
+    'seed',
+    # counts of rows to make
+    'users', 'groups', 'posts', 'comments',
+    # mean amount of subscriptions of a user
+    'follows',
+    # ids after which the ids of new rows start
+    'first_user', 'first_group', 'first_post',
+    # posts are spread evenly from start to end
+    'start', 'end',
+    # names of stored pictures and the share of posts that have one
+    'images', 'with_image',
+])
+
+
+@lru_cache(maxsize=None)
+def get_faker():
+    return Faker('ru_RU')
+
+
+def chunk_random(plan, kind, start):
+    return random.Random(f'{plan.seed}:{kind}:{start}')
+
+
+def power_law_index(rng, size):
+    """Index in range(size), low indexes much more likely."""
+    # inverse transform sampling of the continuous power law on
+    # [1, size + 1)
+    power = 1 - POPULARITY_EXPONENT
+    x = (((size + 1) ** power - 1) * rng.random() + 1) ** (1 / power)
+    return min(int(x) - 1, size - 1)
+
+
+def post_date(plan, index):
+    return plan.start + (plan.end - plan.start) * (index + 0.5) / plan.posts
+
+
+def draw_picture(seed, index):
+    """JPEG of random shapes, different for every index."""
+    rng = random.Random(f'{seed}:pictures:{index}')
+    width, height = PICTURE_SIZE
+
+    def color():
+        return tuple(rng.randrange(256) for _ in range(3))
+
+    picture = Image.new('RGB', PICTURE_SIZE, color())
+    draw = ImageDraw.Draw(picture)
+    for _ in range(12):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(20, height // 2)
+        draw.ellipse(
+            (x - radius, y - radius, x + radius, y + radius), fill=color()
+        )
+    content = BytesIO()
+    picture.save(content, 'JPEG', quality=85)
+    return content.getvalue()
+
+
+def make_groups(plan, start, count):
+    fake = get_faker()
+    fake.seed_instance(f'{plan.seed}:groups:{start}')
+    rows = []
+    for index in range(start, start + count):
+        pk = plan.first_group + index + 1
+        title = fake.sentence(nb_words=2).rstrip('.')
+        rows.append({
+            'id': pk,
+            'title': title,
+            'slug': f'{slugify(title)[:40]}-{pk}',
+            'description': fake.paragraph(),
+        })
+    return rows
+
+
+def make_users(plan, start, count):
+    fake = get_faker()
+    fake.seed_instance(f'{plan.seed}:users:{start}')
+    rows = []
+    for index in range(start, start + count):
+        pk = plan.first_user + index + 1
+        rows.append({
+            'id': pk,
+            # the id keeps generated names unique
+            'username': f'{fake.user_name()}_{pk}',
+            'first_name': fake.first_name(),
+            'last_name': fake.last_name(),
+            'email': fake.free_email(),
+            'date_joined': plan.start,
+        })
+    return rows
+
+
+def make_posts(plan, start, count):
+    fake = get_faker()
+    fake.seed_instance(f'{plan.seed}:posts:{start}')
+    rng = chunk_random(plan, 'posts', start)
+    rows = []
+    for index in range(start, start + count):
+        group = None
+        if plan.groups and rng.random() >= NO_GROUP:
+            group = plan.first_group + rng.randrange(plan.groups) + 1
+        image = ''
+        if plan.images and rng.random() < plan.with_image:
+            image = rng.choice(plan.images)
+        rows.append({
+            'id': plan.first_post + index + 1,
+            'text': fake.text(max_nb_chars=rng.randint(50, 1500)),
+            'author_id': (
+                plan.first_user + power_law_index(rng, plan.users) + 1
+            ),
+            'group_id': group,
+            'image': image,
+            'pub_date': post_date(plan, index),
+        })
+    return rows
+
+
+def make_comments(plan, start, count):
+    fake = get_faker()
+    fake.seed_instance(f'{plan.seed}:comments:{start}')
+    rng = chunk_random(plan, 'comments', start)
+    rows = []
+    for _ in range(count):
+        # the newest posts are discussed the most
+        post = plan.posts - 1 - power_law_index(rng, plan.posts)
+        delay = COMMENT_DELAY * rng.expovariate(1)
+        rows.append({
+            'post_id': plan.first_post + post + 1,
+            'author_id': (
+                plan.first_user + power_law_index(rng, plan.users) + 1
+            ),
+            'text': fake.text(max_nb_chars=rng.randint(20, 300)),
+            'pub_date': min(post_date(plan, post) + delay, plan.end),
+        })
+    return rows
+
+
+def make_follows(plan, start, count):
+    """Subscriptions of the users with indexes start...start + count."""
+    rng = chunk_random(plan, 'follows', start)
+    scale = plan.follows * (FOLLOWS_SHAPE - 1) / FOLLOWS_SHAPE
+    rows = []
+    for index in range(start, start + count):
+        wanted = min(
+            int(scale * rng.paretovariate(FOLLOWS_SHAPE)), plan.users - 1
+        )
+        authors = set()
+        # popular authors repeat, so a few more draws than wanted
+        for _ in range(wanted * 2):
+            if len(authors) >= wanted:
+                break
+            author = power_law_index(rng, plan.users)
+            if author != index:
+                authors.add(author)
+        user_id = plan.first_user + index + 1
+        rows.extend(
+            {'user_id': user_id, 'author_id': plan.first_user + author + 1}
+            for author in sorted(authors)
+        )
+    return rows
+
+
+MAKERS = {
+    'groups': make_groups,
+    'users': make_users,
+    'posts': make_posts,
+    'comments': make_comments,
+    'follows': make_follows,
+}
+
+
+def make_rows(task):
+    """Make the rows of one (plan, kind, start, count) task."""
+    plan, kind, start, count = task
+    return kind, MAKERS[kind](plan, start, count)
+
+
+def tasks(plan, chunk_size=CHUNK_SIZE):
+    """Split the dataset into tasks, parents before children."""
+    totals = (
+        ('groups', plan.groups),
+        ('users', plan.users),
+        ('posts', plan.posts),
+        ('comments', plan.comments),
+        # subscriptions are made per user
+        ('follows', plan.users if plan.follows else 0),
+    )
+    for kind, total in totals:
+        for start in range(0, total, chunk_size):
+            yield plan, kind, start, min(chunk_size, total - start)
@@ -0,0 +1,15 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def page_window(page):
+    """Page numbers to link around the given page.
+
+    Falls back to the full range for paginators without a window.
+    """
+    paginator = page.paginator
+    if hasattr(paginator, 'get_page_window'):
+        return paginator.get_page_window(page.number)
+    return paginator.page_range
@@ -0,0 +1,59 @@
+from django import template
+from django.conf import settings
+
+from posts.thumbnails import prefetch_image_variants as prefetch_variants
+from posts.thumbnails import variants_of
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_image_variants(posts):
+    """Resolve responsive variants of a page of posts in one round
+    trip, for responsive_image to use."""
+    prefetch_variants(posts)
+    return ''
+
+
+@register.inclusion_tag('includes/responsive_image.html')
+def responsive_image(post):
+    """Render a post image as <picture> with a srcset per format.
+
+    Browsers pick the first format they know and the narrowest width
+    that fills POST_IMAGE_SIZES on their screen. The original is shown
+    until the fallback variants are ready.
+    """
+    variants = variants_of(post)
+    widths = settings.POST_IMAGE_WIDTHS
+    # a format is offered once all of its widths are ready
+    formats = [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if all((image_format, width) in variants for width in widths)
+    ]
+    sources = [
+        {
+            'type': f'image/{image_format.lower()}',
+            'srcset': ', '.join(
+                f'{variants[image_format, width].url} {width}w'
+                for width in widths
+            ),
+        }
+        for image_format in formats
+    ]
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    width = min(widths, key=lambda width: abs(width - ratio_width))
+    fallback_format = settings.POST_IMAGE_FORMATS[-1]
+    if fallback_format in formats:
+        srcset = sources.pop()['srcset']
+        src = variants[fallback_format, width].url
+    else:
+        srcset = ''
+        src = post.image.url
+    return {
+        'sources': sources,
+        'srcset': srcset,
+        'sizes': settings.POST_IMAGE_SIZES,
+        'src': src,
+        'width': width,
+        'height': round(width * ratio_height / ratio_width),
+    }
@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..paginators import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.author = User.objects.create(username='Nikitka')
+        cls.group = Group.objects.create(
+            title='Группа №16',
+            description='Описание тестовой группы',
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост номер {index} про котиков',
+                author=cls.author,
+                group=cls.group,
+            )
+            for index in range(0, 5)
+        ]
+        cls.other = Post.objects.create(text='Про погоду', author=cls.admin)
+        Comment.objects.create(
+            post=cls.other, author=cls.author, text='Отличная погода'
+        )
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(AdminChangelistTests.admin)
+
+    def changelist(self, model, **params):
+        url = reverse(f'admin:posts_{model}_changelist')
+        return self.client.get(url, params)
+
+    def test_changelists_open(self):
+        """Checking if every changelist of the posts app opens."""
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                self.assertEqual(self.changelist(model).status_code, 200)
+
+    def test_post_search_uses_index(self):
+        """Checking if post search finds posts by words and by the exact
+        username of their author."""
+        response = self.changelist('post', q='котиков')
+        self.assertEqual(
+            set(response.context['cl'].result_list), set(self.posts)
+        )
+        response = self.changelist('post', q='admin')
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.other])
+
+    def test_comment_search(self):
+        """Checking if comments are searched by text and author."""
+        for query in ('погода', 'Nikitka'):
+            with self.subTest(query=query):
+                response = self.changelist('comment', q=query)
+                self.assertEqual(len(response.context['cl'].result_list), 1)
+
+    def test_autocomplete_filter(self):
+        """Checking if the author filter narrows the changelist and
+        renders an autocomplete field instead of a list of users."""
+        response = self.changelist(
+            'post', author__id__exact=self.admin.pk
+        )
+
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.other])
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, 'autocomplete_filter.js')
+
+    def test_group_choices_are_read_once(self):
+        """Checking if editable groups of the post changelist do not
+        read the groups once per row."""
+        queries = []
+        # one post and five posts
+        for query in ('погоду', 'котиков'):
+            with CaptureQueriesContext(connection) as context:
+                response = self.changelist('post', q=query)
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+        self.assertContains(response, 'Группа №16')
+
+    def test_rows_are_not_counted_without_filters(self):
+        """Checking if an unfiltered changelist estimates its total by
+        the largest id."""
+        paginator = EstimatedCountPaginator(Post.objects.all(), 100)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(paginator.count, self.other.pk)
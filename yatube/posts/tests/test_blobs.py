@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from ..models import MediaBlob, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_THUMBNAILS_ASYNC=False)
+class MediaBlobsTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create(username='Nikitka')
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        cache.clear()
+
+    def create_post(self, name, content):
+        return Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        """Checking if the same picture uploaded twice is stored once
+        under a sharded content hash name."""
+        first = self.create_post('first.gif', SMALL_GIF)
+        second = self.create_post('second.gif', SMALL_GIF)
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name, r'^posts/\w\w/\w\w/\w{64}\.gif$'
+        )
+        self.assertEqual(MediaBlob.objects.get(name=first.image.name).refs, 2)
+
+    def test_blob_is_freed_with_its_last_post(self):
+        """Checking if a shared blob outlives one of its posts and is
+        deleted with the last one."""
+        first = self.create_post('first.gif', SMALL_GIF)
+        second = self.create_post('second.gif', SMALL_GIF)
+        name = first.image.name
+        storage = first.image.storage
+
+        first.delete()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 1)
+
+        second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_replaced_image_is_freed(self):
+        """Checking if editing a post to another picture drops the
+        reference to the old one."""
+        post = self.create_post('first.gif', SMALL_GIF)
+        old_name = post.image.name
+
+        post.image = SimpleUploadedFile('other.gif', OTHER_GIF, 'image/gif')
+        post.save()
+
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertEqual(MediaBlob.objects.get(name=post.image.name).refs, 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_THUMBNAILS_ASYNC=False)
+class CleanMediaTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        cache.clear()
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=User.objects.create(username='Nikitka'),
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.kept = self.media_files()
+        self.orphans = ['posts/old.gif', 'cache/ab/cd/abcd.jpg']
+        for name in self.orphans:
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as orphan:
+                orphan.write(OTHER_GIF)
+
+    def media_files(self):
+        return {
+            os.path.relpath(os.path.join(path, name), TEMP_MEDIA_ROOT)
+            for path, _, names in os.walk(TEMP_MEDIA_ROOT)
+            for name in names
+        }
+
+    def clean_media(self, **options):
+        out = StringIO()
+        call_command('clean_media', stdout=out, **options)
+        return out.getvalue()
+
+    def test_dry_run_only_reports(self):
+        """Checking if a dry run reports orphans and deletes nothing."""
+        output = self.clean_media(dry_run=True, min_age=0, verbosity=2)
+
+        for name in self.orphans:
+            with self.subTest(name=name):
+                self.assertIn(name, output)
+        self.assertIn('Found 2 orphans', output)
+        self.assertIn('files/s', output)
+        self.assertEqual(
+            self.media_files(), self.kept | set(self.orphans)
+        )
+
+    def test_orphans_are_deleted(self):
+        """Checking if orphaned images and thumbnails are deleted, while
+        the image of a post and its thumbnails stay."""
+        output = self.clean_media(min_age=0)
+
+        self.assertIn('Deleted 2 orphans', output)
+        self.assertEqual(self.media_files(), self.kept)
+        self.assertIn(self.post.image.name, self.kept)
+        self.assertTrue(any(name.startswith('cache/') for name in self.kept))
+
+    def test_recent_files_are_skipped(self):
+        """Checking if files newer than min-age are left alone."""
+        output = self.clean_media()
+
+        self.assertIn('Deleted 0 orphans', output)
+        self.assertEqual(
+            self.media_files(), self.kept | set(self.orphans)
+        )
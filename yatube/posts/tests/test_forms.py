@@ -1,12 +1,15 @@
 import tempfile
 import shutil
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.test import TestCase, Client, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from PIL import Image
 
+from ..forms import PostForm
 from ..models import Group, Post
 
 User = get_user_model()
@@ -89,7 +92,9 @@ class FormsViewsTests(TestCase):
         self.assertEqual(created_post.text, form_data['text'])
         self.assertEqual(created_post.group, FormsViewsTests.group_1)
         self.assertEqual(created_post.author, FormsViewsTests.user_1)
-        self.assertEqual(created_post.image, 'posts/small.gif')
+        self.assertRegex(
+            created_post.image.name, r'^posts/\w\w/\w\w/\w{64}\.gif$'
+        )
 
     def test_edit_post(self):
         """Checking editing of a new post from posts:create View."""
@@ -119,3 +124,72 @@ class FormsViewsTests(TestCase):
             'posts:post_detail',
             kwargs={'post_id': 1},
         ))
+
+
+def make_jpeg(name, size):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Nikitka')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def post_form(self, image):
+        return PostForm(data={'text': 'Пост с картинкой'},
+                        files={'image': image})
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_too_big_file_is_rejected(self):
+        """Checking if an image over the byte limit is rejected."""
+        form = self.post_form(make_jpeg('big.jpg', (100, 100)))
+
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['image'][0], 'Файл больше 0 МБ.')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=5000)
+    def test_too_many_pixels_are_rejected(self):
+        """Checking if an image over the megapixel limit is rejected."""
+        form = self.post_form(make_jpeg('wide.jpg', (100, 100)))
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('мегапикселей', form.errors['image'][0])
+
+    @override_settings(POST_IMAGE_MAX_SIDE=40)
+    def test_oversized_image_is_downsized(self):
+        """Checking if an image over the side limit is stored
+        downsized, keeping its proportions."""
+        form = self.post_form(make_jpeg('large.jpg', (100, 50)))
+
+        self.assertTrue(form.is_valid())
+        post = form.save(commit=False)
+        post.author = ImageUploadTests.user
+        post.save()
+
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (40, 20))
+            self.assertEqual(stored.format, 'JPEG')
+
+    def test_small_image_is_stored_as_is(self):
+        """Checking if an image within the limits is not re-encoded."""
+        upload = make_jpeg('small.jpg', (100, 50))
+        content = upload.read()
+        upload.seek(0)
+        form = self.post_form(upload)
+
+        self.assertTrue(form.is_valid())
+        post = form.save(commit=False)
+        post.author = ImageUploadTests.user
+        post.save()
+
+        with open(post.image.path, 'rb') as stored:
+            self.assertEqual(stored.read(), content)
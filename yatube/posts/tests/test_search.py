@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import match_query, search_posts
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='Nikitka')
+        cls.often = Post.objects.create(
+            text='Котики, котики и ещё раз котики',
+            author=cls.user,
+        )
+        cls.once = Post.objects.create(
+            text='Длинный пост про собак, в котором один раз '
+                 'упомянуты котики и много всего остального',
+            author=cls.user,
+        )
+        cls.other = Post.objects.create(
+            text='Пост про погоду <b>без</b> животных',
+            author=cls.user,
+        )
+
+    def test_match_query_quotes_words(self):
+        """Checking if FTS5 syntax in a query is not passed through."""
+        self.assertEqual(match_query('кот OR "пёс"*'), '"кот"* "OR"* "пёс"*')
+        self.assertIsNone(match_query(' "*" '))
+
+    def test_results_are_ranked(self):
+        """Checking if the best match comes first and posts without a
+        match are left out."""
+        page = search_posts('котики')
+
+        self.assertEqual(list(page), [self.often, self.once])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        """Checking if matches are marked and post html is escaped."""
+        post = list(search_posts('погоду'))[0]
+
+        self.assertIn('<mark>погоду</mark>', post.snippet)
+        self.assertIn('&lt;b&gt;', post.snippet)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Checking if the index is updated by saving and deleting."""
+        post = Post.objects.create(text='Первая версия', author=self.user)
+        post.text = 'Вторая версия'
+        post.save()
+
+        self.assertEqual(list(search_posts('первая')), [])
+        self.assertEqual(list(search_posts('вторая')), [post])
+
+        post.delete()
+        self.assertEqual(list(search_posts('вторая')), [])
+
+    def test_keyset_pages(self):
+        """Checking if cursors walk through every result once."""
+        for index in range(0, 5):
+            Post.objects.create(
+                text=f'Ещё котики номер {index}', author=self.user
+            )
+        seen = []
+        page = search_posts('котики', per_page=3)
+        seen += list(page)
+        while page.has_next():
+            page = search_posts('котики', page.next_cursor, per_page=3)
+            seen += list(page)
+
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_search_view(self):
+        """Checking if the search page shows matching posts."""
+        response = Client().get(reverse('posts:search'), {'q': 'котики'})
+
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.often, self.once])
+        self.assertContains(response, '<mark>Котики</mark>')
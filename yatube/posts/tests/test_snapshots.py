@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post
+from ..snapshots import SnapshotLoader, iter_array
+
+User = get_user_model()
+
+SNAPSHOT = [
+    {'model': 'posts.comment', 'pk': 1, 'fields': {
+        'pub_date': '2022-02-02T05:01:21Z', 'post': 10, 'author': 3,
+        'text': 'Комментарий раньше поста'}},
+    {'model': 'posts.group', 'pk': 2, 'fields': {
+        'title': 'Группа', 'slug': 'gruppa', 'description': 'Описание'}},
+    {'model': 'sessions.session', 'pk': 'abc', 'fields': {
+        'session_data': '', 'expire_date': '2022-02-02T05:01:21Z'}},
+    {'model': 'auth.user', 'pk': 3, 'fields': {
+        'password': '!', 'username': 'leo', 'groups': [],
+        'user_permissions': []}},
+    {'model': 'auth.user', 'pk': 4, 'fields': {
+        'password': '!', 'username': 'sonya', 'groups': [],
+        'user_permissions': []}},
+    {'model': 'posts.follow', 'pk': 1, 'fields': {'user': 4, 'author': 3}},
+    {'model': 'posts.post', 'pk': 10, 'fields': {
+        'pub_date': '1854-03-14T00:00:00Z', 'text': 'Дневник', 'author': 3,
+        'group': 2, 'image': ''}},
+    {'model': 'posts.comment', 'pk': 2, 'fields': {
+        'pub_date': '2022-02-02T05:01:21Z', 'post': 99, 'author': 3,
+        'text': 'Комментарий к посту, которого нет'}},
+]
+
+
+class SnapshotTests(TestCase):
+    def test_array_is_decoded_across_chunks(self):
+        """Checking if items split between chunks are decoded."""
+        text = json.dumps(SNAPSHOT, ensure_ascii=False, indent=2)
+
+        self.assertEqual(
+            list(iter_array(StringIO(text), chunk_size=7)), SNAPSHOT
+        )
+        self.assertEqual(list(iter_array(StringIO(' [ ] '))), [])
+
+    def test_broken_snapshot_is_rejected(self):
+        """Checking if something other than an array is an error."""
+        for text in ('{"model": "posts.group"}', '[{"model": 1} {}]', '[{'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    list(iter_array(StringIO(text), chunk_size=4))
+
+    def test_rows_are_loaded_in_any_order(self):
+        """Checking if children listed before their parents are loaded
+        and rows without parents are reported."""
+        loader = SnapshotLoader(batch_size=2)
+
+        loader.load(StringIO(json.dumps(SNAPSHOT)))
+
+        self.assertEqual(Group.objects.get().slug, 'gruppa')
+        post = Post.objects.get()
+        self.assertEqual(post.author.username, 'leo')
+        self.assertEqual(post.pub_date.year, 1854)
+        self.assertEqual(Comment.objects.get().post_id, 10)
+        self.assertTrue(
+            Follow.objects.filter(user=4, author=3).exists()
+        )
+        self.assertEqual(loader.skipped['sessions.session'], 1)
+        self.assertEqual(loader.invalid['posts.comment'], 1)
+
+    def test_command_rebuilds_derived_data(self):
+        """Checking if load_snapshot refreshes counters and timelines
+        that bulk inserts bypass."""
+        path = self.write_snapshot()
+
+        call_command('load_snapshot', path, stdout=StringIO(),
+                     stderr=StringIO())
+
+        post = Post.objects.get()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(User.objects.get(pk=3).counters.followers_count, 1)
+        self.assertTrue(post.timeline_entries.filter(user=4).exists())
+
+    def write_snapshot(self):
+        snapshot = tempfile.NamedTemporaryFile(
+            'w', suffix='.json', delete=False, encoding='utf-8'
+        )
+        with snapshot:
+            json.dump(SNAPSHOT, snapshot)
+        self.addCleanup(os.remove, snapshot.name)
+        return snapshot.name
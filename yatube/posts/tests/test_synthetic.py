@@ -0,0 +1,133 @@
+import random
+import shutil
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Comment, Follow, Group, MediaBlob, Post, TimelineEntry
+from ..synthetic import Plan, make_rows, power_law_index, tasks
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+END = datetime(2022, 3, 1, tzinfo=timezone.utc)
+PLAN = Plan(
+    seed=1, users=50, groups=3, posts=200, comments=300, follows=5,
+    first_user=0, first_group=0, first_post=0,
+    start=END - timedelta(days=30), end=END,
+    images=('posts/a.jpg', 'posts/b.jpg'), with_image=0.5,
+)
+
+
+def make_dataset(plan, chunk_size):
+    rows = {}
+    for task in tasks(plan, chunk_size):
+        kind, chunk = make_rows(task)
+        rows.setdefault(kind, []).extend(chunk)
+    return rows
+
+
+class SyntheticRowsTests(TestCase):
+    def test_same_seed_gives_same_rows(self):
+        """Checking if a dataset depends on its seed only, not on how
+        it is split into chunks."""
+        dataset = make_dataset(PLAN, 40)
+
+        self.assertEqual(make_dataset(PLAN, 40), dataset)
+        self.assertNotEqual(
+            make_dataset(PLAN._replace(seed=2), 40), dataset
+        )
+        self.assertEqual(len(dataset['users']), 50)
+        self.assertEqual(len(dataset['comments']), 300)
+
+    def test_follows_are_unique_and_skewed(self):
+        """Checking if nobody follows themselves or anyone twice, and
+        a few authors have most of the followers."""
+        follows = make_dataset(PLAN._replace(users=1000, posts=0,
+                                             comments=0, groups=0), 250)
+        pairs = [(row['user_id'], row['author_id'])
+                 for row in follows['follows']]
+
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertFalse([pair for pair in pairs if pair[0] == pair[1]])
+        followers = Counter(author for _, author in pairs)
+        top = sum(total for _, total in followers.most_common(100))
+        self.assertGreater(top, len(pairs) / 2)
+
+    def test_power_law_index_stays_in_range(self):
+        """Checking if drawn indexes are in range, low ones first."""
+        rng = random.Random(0)
+        drawn = Counter(power_law_index(rng, 10) for _ in range(5000))
+
+        self.assertEqual(set(drawn), set(range(10)))
+        self.assertGreater(drawn[0], drawn[9])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDatasetCommandTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def generate(self, **options):
+        call_command(
+            'generate_dataset', users=30, groups=2, posts=100,
+            comments=150, follows=4, seed=7, end_date=END.date(),
+            stdout=StringIO(), **options
+        )
+
+    def test_dataset_is_written_with_derived_data(self):
+        """Checking if the dataset lands in the database with counters,
+        timelines and image references rebuilt."""
+        self.generate(workers=2, images=0.5, pictures=2, batch_size=40)
+
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 150)
+        post = Post.objects.order_by('pub_date').first()
+        self.assertEqual(post.comments_count, post.comments.count())
+        self.assertGreater(post.pub_date, END - timedelta(days=365))
+        latest = Post.objects.latest('pub_date')
+        self.assertLess(latest.pub_date, END + timedelta(days=1))
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        author = User.objects.get(pk=latest.author_id)
+        self.assertEqual(author.counters.posts_count, author.posts.count())
+        self.assertEqual(MediaBlob.objects.count(), 2)
+        self.assertEqual(
+            sum(MediaBlob.objects.values_list('refs', flat=True)),
+            Post.objects.exclude(image='').count(),
+        )
+
+    def test_batch_size_does_not_change_the_dataset(self):
+        """Checking if the same seed writes the same rows whatever
+        batches they are written in."""
+        def written(batch_size):
+            self.generate(workers=1, batch_size=batch_size)
+            rows = list(Post.objects.order_by('pk').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug',
+            ))
+            rows += list(Follow.objects.order_by('pk').values_list(
+                'user__username', 'author__username',
+            ))
+            User.objects.all().delete()
+            Group.objects.all().delete()
+            return rows
+
+        self.assertEqual(written(7), written(5000))
+
+    def test_dataset_goes_after_existing_rows(self):
+        """Checking if a second dataset is added next to the first."""
+        self.generate(workers=1)
+        self.generate(workers=1)
+
+        self.assertEqual(User.objects.count(), 60)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Post.objects.filter(author__pk__gt=30).count(), 100)
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+
+from ..models import Post
+from ..thumbnails import image_variants, resolve_image_variants
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_THUMBNAILS_ASYNC=False)
+class ThumbnailsTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create(username='Nikitka')
+        # sorl keeps thumbnail records in cache, they must not outlive
+        # the files of the previous test
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        cache.clear()
+
+    def thumbnail_files(self):
+        return [
+            name
+            for _, _, names in os.walk(os.path.join(TEMP_MEDIA_ROOT, 'cache'))
+            for name in names
+        ]
+
+    def test_thumbnails_are_made_on_upload(self):
+        """Checking if saving a post with an image makes its thumbnails
+        before any page is rendered."""
+        Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.assertEqual(
+            len(self.thumbnail_files()), len(list(image_variants()))
+        )
+
+    def test_post_without_image_makes_no_thumbnails(self):
+        """Checking if a post without an image does not make
+        thumbnails."""
+        Post.objects.create(text='Пост без картинки', author=self.user)
+        self.assertEqual(self.thumbnail_files(), [])
+
+    def test_variants_of_a_page_are_resolved_at_once(self):
+        """Checking if every responsive variant of several posts is
+        found with a single query."""
+        posts = [
+            Post.objects.create(
+                text=f'Пост с картинкой {index}',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    f'small_{index}.gif', SMALL_GIF, 'image/gif'
+                ),
+            )
+            for index in range(0, 2)
+        ]
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            variants = resolve_image_variants(posts)
+
+        for post in posts:
+            with self.subTest(post=post.text):
+                self.assertEqual(
+                    set(variants[post.pk]),
+                    {(image_format, width)
+                     for image_format, width, _, _ in image_variants()},
+                )
+
+    def test_responsive_image_markup(self):
+        """Checking if responsive_image renders <picture> with a WebP
+        source and a JPEG fallback for every width."""
+        post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        template = Template(
+            '{% load post_thumbnails %}{% responsive_image post %}'
+        )
+
+        html = template.render(Context({'post': post}))
+
+        self.assertIn('<picture>', html)
+        self.assertIn('<source type="image/webp"', html)
+        self.assertNotIn('<source type="image/jpeg"', html)
+        for width in settings.POST_IMAGE_WIDTHS:
+            with self.subTest(width=width):
+                self.assertRegex(html, rf'\.webp {width}w')
+                self.assertRegex(html, rf'\.jpg {width}w')
+
+    def test_missing_variants_are_scheduled_not_made(self):
+        """Checking if a page shows the original image of a post whose
+        variants are not ready and leaves them to be made after it."""
+        template = Template(
+            '{% load post_thumbnails %}{% responsive_image post %}'
+        )
+        with transaction.atomic():
+            post = Post.objects.create(
+                text='Пост с картинкой',
+                author=self.user,
+                image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+            )
+            html = template.render(Context({'post': post}))
+            self.assertEqual(self.thumbnail_files(), [])
+
+        self.assertIn(f'src="{post.image.url}"', html)
+        self.assertNotIn('<source', html)
+        self.assertTrue(cache.get(f'thumbnails_scheduled:{post.image.name}'))
+        self.assertEqual(
+            len(self.thumbnail_files()), len(list(image_variants()))
+        )
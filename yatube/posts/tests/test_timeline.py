@@ -0,0 +1,227 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ..caching import feed_version_key
+from ..models import Comment, Follow, Post, TimelineEntry
+from ..timeline import timeline_posts
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(username='Chitatel')
+        cls.author = User.objects.create(username='Pisatel')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author,
+        )
+
+    def test_follow_backfills_timeline(self):
+        """Checking if following an author brings their posts
+        into the timeline."""
+        Follow.objects.create(
+            user=TimelineTests.reader,
+            author=TimelineTests.author,
+        )
+        self.assertEqual(
+            list(timeline_posts(TimelineTests.reader)),
+            [TimelineTests.old_post],
+        )
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Checking if a new post lands in the followers' timelines
+        only."""
+        Follow.objects.create(
+            user=TimelineTests.reader,
+            author=TimelineTests.author,
+        )
+        post = Post.objects.create(
+            text='Пост после подписки',
+            author=TimelineTests.author,
+        )
+        self.assertEqual(
+            list(timeline_posts(TimelineTests.reader)),
+            [post, TimelineTests.old_post],
+        )
+        self.assertFalse(timeline_posts(TimelineTests.author).exists())
+
+    def test_unfollow_prunes_timeline(self):
+        """Checking if unfollowing an author removes their posts
+        from the timeline."""
+        follow = Follow.objects.create(
+            user=TimelineTests.reader,
+            author=TimelineTests.author,
+        )
+        follow.delete()
+        self.assertFalse(timeline_posts(TimelineTests.reader).exists())
+
+    @override_settings(TIMELINE_DEPTH=3)
+    def test_timeline_is_trimmed_to_depth(self):
+        """Checking if a timeline keeps only the newest posts."""
+        Follow.objects.create(
+            user=TimelineTests.reader,
+            author=TimelineTests.author,
+        )
+        posts = [
+            Post.objects.create(text=f'Пост {index}', author=self.author)
+            for index in range(0, 4)
+        ]
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=TimelineTests.reader).count(),
+            3,
+        )
+        self.assertEqual(
+            list(timeline_posts(TimelineTests.reader)),
+            posts[:0:-1],
+        )
+
+    def follow(self, reader, unfollow=False):
+        """Follow the author through the view, which keeps counters."""
+        self.client.force_login(reader)
+        route = 'posts:profile_follow'
+        if unfollow:
+            route = 'posts:profile_unfollow'
+        self.client.get(
+            reverse(route, kwargs={'username': TimelineTests.author})
+        )
+
+    @override_settings(TIMELINE_PUSH_THRESHOLD=1)
+    def test_popular_author_is_pulled_at_read_time(self):
+        """Checking if posts of an author above the threshold are
+        not pushed, but still shown in the timeline."""
+        self.follow(TimelineTests.reader)
+        post = Post.objects.create(
+            text='Пост популярного автора',
+            author=TimelineTests.author,
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(
+            list(timeline_posts(TimelineTests.reader)),
+            [post, TimelineTests.old_post],
+        )
+
+    @override_settings(TIMELINE_PUSH_THRESHOLD=1)
+    def test_popular_author_does_not_bump_followers(self):
+        """Checking if posts and comments of a pulled author leave the
+        followers' versions alone and still refresh their follow feed."""
+        cache.clear()
+        self.follow(TimelineTests.reader)
+        self.client.get(reverse('posts:follow_index'))
+        key = feed_version_key('follow', TimelineTests.reader.pk)
+        version = cache.get(key)
+
+        post = Post.objects.create(
+            text='Пост популярного автора', author=TimelineTests.author
+        )
+        Comment.objects.create(
+            post=post, author=TimelineTests.reader, text='Комментарий'
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+
+        self.assertEqual(cache.get(key), version)
+        self.assertContains(response, 'Пост популярного автора')
+
+    def test_posts_of_one_moment_are_ordered_by_id(self):
+        """Checking if posts published at the same moment keep a stable
+        order, newest id first, so pages neither repeat nor skip them."""
+        Follow.objects.create(
+            user=TimelineTests.reader, author=TimelineTests.author
+        )
+        for number in range(0, 5):
+            Post.objects.create(
+                text=f'Пост номер {number}', author=TimelineTests.author
+            )
+        moment = timezone.now()
+        Post.objects.update(pub_date=moment)
+        TimelineEntry.objects.update(pub_date=moment)
+
+        posts = timeline_posts(TimelineTests.reader)
+
+        self.assertEqual(
+            [post.pk for post in posts],
+            sorted(Post.objects.values_list('pk', flat=True), reverse=True),
+        )
+        self.assertIn(
+            '"posts_timelineentry"."post_id" DESC', str(posts.query)
+        )
+
+    def test_timeline_classes_command(self):
+        """Checking if the report puts authors into their classes."""
+        Follow.objects.create(
+            user=TimelineTests.reader,
+            author=TimelineTests.author,
+        )
+        out = StringIO()
+        call_command('timeline_classes', threshold=1, stdout=out)
+        self.assertIn('pull\t1\tPisatel', out.getvalue())
+        self.assertIn('0 pushed, 1 pulled', out.getvalue())
+
+    @override_settings(TIMELINE_DEPTH=2)
+    def test_rebuild_timelines_command(self):
+        """Checking if rebuilt timelines hold the newest posts of
+        followed authors, up to the depth."""
+        Follow.objects.create(
+            user=TimelineTests.reader,
+            author=TimelineTests.author,
+        )
+        posts = [
+            Post.objects.create(text=f'Пост {index}', author=self.author)
+            for index in range(0, 3)
+        ]
+        TimelineEntry.objects.all().delete()
+
+        call_command('rebuild_timelines', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            list(timeline_posts(TimelineTests.reader)),
+            posts[:0:-1],
+        )
+
+    def test_pushing_to_more_followers_makes_no_more_queries(self):
+        """Checking if a new post is pushed and timelines are trimmed
+        with the same queries for any amount of followers."""
+        queries = []
+        for followers in (1, 5):
+            for index in range(followers):
+                reader = User.objects.create(
+                    username=f'reader_{followers}_{index}'
+                )
+                Follow.objects.create(user=reader, author=self.author)
+            with CaptureQueriesContext(connection) as context:
+                Post.objects.create(text='Пост', author=TimelineTests.author)
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+
+    @override_settings(TIMELINE_PUSH_THRESHOLD=2)
+    def test_author_crossing_the_threshold_changes_class(self):
+        """Checking if posts written while an author was pulled stay in
+        the timelines after the author is pushed again."""
+        other = User.objects.create(username='Drugoy')
+        self.follow(TimelineTests.reader)
+        self.follow(other)
+        self.assertFalse(TimelineEntry.objects.exists())
+        post = Post.objects.create(
+            text='Пока автор популярен', author=TimelineTests.author
+        )
+
+        self.follow(other, unfollow=True)
+
+        self.assertEqual(
+            list(timeline_posts(TimelineTests.reader)),
+            [post, TimelineTests.old_post],
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=TimelineTests.reader).count(),
+            2,
+        )
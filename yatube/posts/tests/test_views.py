@@ -1,5 +1,6 @@
 import tempfile
 import shutil
+from io import StringIO
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
@@ -8,8 +9,11 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django import forms
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models.signals import post_save
 
-from ..models import Group, Post, Follow
+from ..models import Comment, Group, Post, Follow, UserCounters
+from ..paginators import FeedPaginator, feed_count_key
 
 User = get_user_model()
 
@@ -183,7 +187,7 @@ class PostsViewsTests(TestCase):
                 self.assertEqual(post_group,
                                  PostsViewsTests.post_with_group.group)
                 self.assertEqual(post_image,
-                                 'posts/small.gif')
+                                 PostsViewsTests.post_with_group.image)
 
     def test_post_details_page_show_correct_context(self):
         """Checking if correct context is rendered
@@ -200,19 +204,18 @@ class PostsViewsTests(TestCase):
         self.assertEqual(post_text, PostsViewsTests.post_with_group.text)
         self.assertEqual(post_author, PostsViewsTests.post_with_group.author)
         self.assertEqual(post_group, PostsViewsTests.post_with_group.group)
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, PostsViewsTests.post_with_group.image)
 
     def test_index_cache(self):
-        """Checking if posts:index page is cached"""
+        """Checking if posts:index page is cached until posts change"""
         initial_response = self.guest_client.get(
             path=reverse('posts:index')
         )
         initial_content = initial_response.content
 
-        Post.objects.create(
-            text='тест кеширования',
-            author=PostsViewsTests.user_1,
-            group=PostsViewsTests.group_1,
+        # update() bypasses signals, the cached page stays as it was
+        Post.objects.filter(pk=PostsViewsTests.post_with_group.pk).update(
+            text='изменено в обход сигналов'
         )
 
         cached_response = self.guest_client.get(
@@ -222,7 +225,11 @@ class PostsViewsTests(TestCase):
 
         self.assertEqual(initial_content, cached_content)
 
-        cache.clear()
+        Post.objects.create(
+            text='тест кеширования',
+            author=PostsViewsTests.user_1,
+            group=PostsViewsTests.group_1,
+        )
 
         new_response = self.guest_client.get(
             path=reverse('posts:index')
@@ -230,6 +237,72 @@ class PostsViewsTests(TestCase):
         new_content = new_response.content
 
         self.assertNotEqual(cached_content, new_content)
+        self.assertContains(new_response, 'тест кеширования')
+
+    def test_feed_pages_are_refreshed_by_comments(self):
+        """Checking if a new comment invalidates cached feed pages"""
+        addresses = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'pk': 'gruppa-16'}),
+            reverse('posts:profile', kwargs={'username': 'Nikitka'}),
+        ]
+        versions = {
+            address: self.guest_client.get(address).context[
+                'feed_cache'
+            ].version
+            for address in addresses
+        }
+        Comment.objects.create(
+            post=PostsViewsTests.post_with_group,
+            author=PostsViewsTests.user_2,
+            text='Комментарий',
+        )
+        for address, version in versions.items():
+            with self.subTest(address=address):
+                response = self.guest_client.get(address)
+                self.assertNotEqual(
+                    response.context['feed_cache'].version, version
+                )
+
+    def test_refreshed_feed_pages_count_the_new_comment(self):
+        """Checking if a feed page cached again after a comment shows
+        the new comments count"""
+        address = reverse('posts:profile', kwargs={'username': 'Nikitka'})
+        count = PostsViewsTests.post_with_group.comments_count
+
+        def read_page(**kwargs):
+            # another reader, right after the comment refreshed the page
+            self.guest_client.get(address)
+
+        post_save.connect(read_page, sender=Comment)
+        self.addCleanup(post_save.disconnect, read_page, sender=Comment)
+        self.authorised_client_2.post(
+            reverse(
+                'posts:add_comment',
+                kwargs={'post_id': PostsViewsTests.post_with_group.pk},
+            ),
+            data={'text': 'Комментарий'},
+        )
+        response = self.guest_client.get(address)
+        self.assertContains(response, f'Комментариев: {count + 1}')
+
+    def test_failed_comment_leaves_the_count(self):
+        """Checking if a comment that is not saved is not counted"""
+        post = PostsViewsTests.post_with_group
+
+        def fail(**kwargs):
+            raise RuntimeError('Сбой при сохранении')
+
+        post_save.connect(fail, sender=Comment)
+        self.addCleanup(post_save.disconnect, fail, sender=Comment)
+        with self.assertRaises(RuntimeError):
+            self.authorised_client_2.post(
+                reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+                data={'text': 'Комментарий'},
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertFalse(post.comments.exists())
 
     def test_authorised_can_follow(self):
         """Checking if an authorised user is able
@@ -299,12 +372,43 @@ class PostsViewsTests(TestCase):
         )
         self.assertEqual(len(response.context['page_obj']), 0)
 
+    def test_follow_feed_cache_is_per_user(self):
+        """Checking if cached follow feed pages are not shared between
+        users and are refreshed by new posts and subscriptions"""
+        self.authorised_client_2.get(
+            path=reverse(
+                'posts:profile_follow',
+                kwargs={'username': PostsViewsTests.user_1.username}
+            )
+        )
+        response = self.authorised_client_2.get(reverse('posts:follow_index'))
+        self.assertContains(response, PostsViewsTests.post_with_group.text)
+        response = self.authorised_client_1.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, PostsViewsTests.post_with_group.text)
+
+        Post.objects.create(
+            text='Свежий пост для подписчиков',
+            author=PostsViewsTests.user_1,
+        )
+        response = self.authorised_client_2.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Свежий пост для подписчиков')
+
+        self.authorised_client_2.get(
+            path=reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': PostsViewsTests.user_1.username}
+            )
+        )
+        response = self.authorised_client_2.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, 'Свежий пост для подписчиков')
+
 
 class PaginatorViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
         cls.user_1 = User.objects.create(username='Nikitka')
+        cls.user_2 = User.objects.create(username='Dyusha')
         cls.group_1 = Group.objects.create(
             title='Группа №16',
             description='Описание тестовой группы'
@@ -335,6 +439,83 @@ class PaginatorViewsTests(TestCase):
                 response = self.authorised_client_1.get(page, {'page': 2})
                 self.assertEqual(len(response.context['page_obj']), 5)
 
+    def test_cursor_pages_walk_through_the_whole_feed(self):
+        """Checking if cursor mode pages go through all the posts
+        in both directions."""
+        pages_with_multiple_posts = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'pk': 'gruppa-16'}),
+            reverse('posts:profile', kwargs={'username': 'Nikitka'}),
+            reverse('posts:follow_index'),
+        ]
+        Follow.objects.create(
+            user=PaginatorViewsTests.user_2,
+            author=PaginatorViewsTests.user_1,
+        )
+        self.authorised_client_1.force_login(PaginatorViewsTests.user_2)
+        expected = [str(index) for index in range(14, -1, -1)]
+
+        for page in pages_with_multiple_posts:
+            with self.subTest(page=page):
+                first = self.authorised_client_1.get(page, {'cursor': ''})
+                first_page = first.context['page_obj']
+                self.assertFalse(first_page.has_previous())
+                self.assertTrue(first_page.has_next())
+
+                second = self.authorised_client_1.get(
+                    page, {'cursor': first_page.next_cursor}
+                )
+                second_page = second.context['page_obj']
+                self.assertFalse(second_page.has_next())
+                texts = [post.text for post in first_page]
+                texts += [post.text for post in second_page]
+                self.assertEqual(texts, expected)
+
+                back = self.authorised_client_1.get(
+                    page, {'cursor': second_page.previous_cursor}
+                )
+                self.assertEqual(
+                    list(back.context['page_obj']), list(first_page)
+                )
+
+    def test_feed_total_is_cached_until_posts_change(self):
+        """Checking if a feed total is counted once and recounted
+        after a post is created or deleted."""
+        cache.clear()
+        count_key = feed_count_key('index')
+        self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(cache.get(count_key), 15)
+
+        post = Post.objects.create(
+            text='Новый пост',
+            author=PaginatorViewsTests.user_1,
+        )
+        self.assertIsNone(cache.get(count_key))
+        self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(cache.get(count_key), 16)
+
+        post.delete()
+        self.assertIsNone(cache.get(count_key))
+
+    def test_paginator_shows_window_of_page_links(self):
+        """Checking if only the pages around the current one
+        are linked."""
+        paginator = FeedPaginator(Post.objects.all(), 1)
+        self.assertEqual(
+            list(paginator.get_page_window(8)), [6, 7, 8, 9, 10]
+        )
+        self.assertEqual(list(paginator.get_page_window(1)), [1, 2, 3])
+        self.assertEqual(list(paginator.get_page_window(15)), [13, 14, 15])
+
+    def test_broken_cursor_gives_first_page(self):
+        """Checking if an invalid cursor falls back to the first page."""
+        response = self.authorised_client_1.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertFalse(page_obj.has_previous())
+
 
 class CommentsViewsTests(TestCase):
     @classmethod
@@ -400,3 +581,149 @@ class CommentsViewsTests(TestCase):
             response.context['comments'][0].author,
             CommentsViewsTests.user_2,
         )
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(username='Chitatel')
+        cls.group = Group.objects.create(
+            title='Общая группа',
+            description='Описание общей группы'
+        )
+        for index in range(0, 10):
+            author = User.objects.create(
+                username=f'author_{index}',
+                first_name='Имя',
+                last_name=f'Фамилия {index}',
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(
+                text=f'Пост номер {index}',
+                author=author,
+                group=cls.group if index % 2 else Group.objects.create(
+                    title=f'Группа {index}',
+                    description='Описание группы',
+                ),
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorised_client = Client()
+        self.authorised_client.force_login(FeedQueriesTests.reader)
+        cache.clear()
+
+    def test_feed_pages_make_fixed_number_of_queries(self):
+        """Checking if feed pages do not query authors and groups
+        of every post one by one."""
+        pages_queries = {
+            reverse('posts:index'): (self.guest_client, 2),
+            reverse(
+                'posts:group_list', kwargs={'pk': 'obschaya-gruppa'}
+            ): (self.guest_client, 3),
+            reverse(
+                'posts:profile', kwargs={'username': 'author_1'}
+            ): (self.guest_client, 4),
+            reverse('posts:follow_index'): (self.authorised_client, 5),
+        }
+        for page, (client, queries) in pages_queries.items():
+            with self.subTest(page=page):
+                with self.assertNumQueries(queries):
+                    client.get(page)
+
+    def test_explain_feeds_shows_composite_indexes(self):
+        """Checking if feed queries use the composite indexes."""
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        before, after = out.getvalue().split('after:')
+        for index in ('post_date_idx', 'post_group_date_idx',
+                      'post_author_date_idx', 'comment_post_date_idx'):
+            with self.subTest(index=index):
+                self.assertNotIn(index, before)
+                self.assertIn(index, after)
+
+
+class CountersViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_1 = User.objects.create(username='Nikitka')
+        cls.user_2 = User.objects.create(username='Dyusha')
+
+    def setUp(self):
+        self.authorised_client_1 = Client()
+        self.authorised_client_1.force_login(CountersViewsTests.user_1)
+        self.authorised_client_2 = Client()
+        self.authorised_client_2.force_login(CountersViewsTests.user_2)
+        cache.clear()
+
+    def test_views_keep_counters(self):
+        """Checking if creating posts, comments and subscriptions
+        changes the counters."""
+        self.authorised_client_1.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост для счётчиков'},
+        )
+        post = Post.objects.get(text='Пост для счётчиков')
+        self.authorised_client_2.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'},
+        )
+        self.authorised_client_2.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'Nikitka'}
+        ))
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        author = UserCounters.objects.get(user=CountersViewsTests.user_1)
+        self.assertEqual(author.posts_count, 1)
+        self.assertEqual(author.followers_count, 1)
+        reader = UserCounters.objects.get(user=CountersViewsTests.user_2)
+        self.assertEqual(reader.following_count, 1)
+
+        response = self.authorised_client_2.get(reverse(
+            'posts:profile', kwargs={'username': 'Nikitka'}
+        ))
+        self.assertEqual(response.context['counters'], author)
+
+        self.authorised_client_2.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'Nikitka'}
+        ))
+        author.refresh_from_db()
+        reader.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+        self.assertEqual(reader.following_count, 0)
+
+    def test_recount_counters_command(self):
+        """Checking if the command rebuilds counters from the tables."""
+        post = Post.objects.create(
+            text='Пост мимо счётчиков',
+            author=CountersViewsTests.user_1,
+        )
+        Comment.objects.create(
+            post=post,
+            author=CountersViewsTests.user_2,
+            text='Комментарий',
+        )
+        Follow.objects.create(
+            user=CountersViewsTests.user_2,
+            author=CountersViewsTests.user_1,
+        )
+
+        call_command('recount_counters', stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        author = UserCounters.objects.get(user=CountersViewsTests.user_1)
+        self.assertEqual(
+            (author.posts_count, author.followers_count,
+             author.following_count),
+            (1, 1, 0),
+        )
+        reader = UserCounters.objects.get(user=CountersViewsTests.user_2)
+        self.assertEqual(
+            (reader.posts_count, reader.followers_count,
+             reader.following_count),
+            (0, 0, 1),
+        )
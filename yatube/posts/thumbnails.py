@@ -0,0 +1,202 @@
+"""Thumbnails of post images generated ahead of page views.
+
+sorl-thumbnail makes a thumbnail on the first render of a page that
+asks for it, so the first visitor after an upload waits for Pillow.
+Here every responsive variant is generated in a worker thread as soon
+as a post with a new image is committed, and templates only find ready
+files in the key-value store.
+Pages never wait for Pillow: until its variants are ready a post shows
+the original image, and the feeds showing it are refreshed once they
+are made.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.profiling import timed
+
+from .caching import bump_feed_versions
+from .metrics import THUMBNAILS
+from .models import Post
+from .storage import post_images_storage
+from .timeline import pushed_followers
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.POST_THUMBNAILS_WORKERS,
+    thread_name_prefix='thumbnails',
+)
+# a page asking for missing variants schedules them once in this long,
+# in seconds
+SCHEDULE_TIMEOUT = 5 * 60
+
+
+def image_variants():
+    """Yield format, width, geometry and options of every responsive
+    variant of a post image."""
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    for image_format in settings.POST_IMAGE_FORMATS:
+        for width in settings.POST_IMAGE_WIDTHS:
+            height = round(width * ratio_height / ratio_width)
+            options = {
+                'crop': 'center', 'upscale': True, 'format': image_format,
+            }
+            yield image_format, width, f'{width}x{height}', options
+
+
+def make_thumbnail(source, geometry, options):
+    with timed('thumbnails'), THUMBNAILS.time():
+        return get_thumbnail(source, geometry, **options)
+
+
+def generate_thumbnails(image_name):
+    """Make every configured thumbnail of an image."""
+    # thumbnail names depend on the storage of the source, so it must be
+    # the storage templates see on post.image
+    source = ImageFile(image_name, post_images_storage)
+    try:
+        for _, _, geometry, options in image_variants():
+            make_thumbnail(source, geometry, options)
+        refresh_feeds(image_name)
+    except Exception:
+        logger.exception('Thumbnails of %s were not generated', image_name)
+
+
+def refresh_feeds(image_name):
+    """Invalidate cached pages of the feeds showing an image, they may
+    hold the original in place of its variants."""
+    posts = Post.objects.filter(image=image_name).values('author', 'group')
+    for post in posts:
+        bump_feed_versions(
+            post['author'], (post['group'],),
+            pushed_followers(post['author']),
+        )
+
+
+def _generate_in_worker(image_name):
+    close_old_connections()
+    try:
+        generate_thumbnails(image_name)
+    finally:
+        close_old_connections()
+
+
+def schedule_thumbnails(image_name):
+    """Generate thumbnails of an image once the transaction commits."""
+    if settings.POST_THUMBNAILS_ASYNC:
+        transaction.on_commit(
+            lambda: executor.submit(_generate_in_worker, image_name)
+        )
+    else:
+        transaction.on_commit(lambda: generate_thumbnails(image_name))
+
+
+def thumbnail_options(source, options):
+    """Fill options the way sorl's backend does before naming a file."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def _resolve(wanted):
+    """Find ready thumbnails for a dict of any key to image, geometry
+    and options.
+
+    All the key-value store records are read with one cache get_many
+    and, for cache misses, one database query. Returns a dict of the
+    same keys, thumbnails that are not ready yet are left out.
+    """
+    if not isinstance(default.kvstore, KVStore):
+        return {}
+    keys = {}
+    for wanted_key, (image, geometry, options) in wanted.items():
+        source = ImageFile(image)
+        name = default.backend._get_thumbnail_filename(
+            source, geometry, thumbnail_options(source, options)
+        )
+        # posts sharing one image share its thumbnails too
+        keys.setdefault(
+            add_prefix(ImageFile(name, default.storage).key), []
+        ).append(wanted_key)
+    if not keys:
+        return {}
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value')
+        )
+        kv_cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    # sorl caches a marker class for keys missing from the database
+    return {
+        wanted_key: deserialize_image_file(value)
+        for key, value in values.items() if isinstance(value, str)
+        for wanted_key in keys[key]
+    }
+
+
+def resolve_image_variants(posts):
+    """Find ready responsive variants of a page of posts at once.
+
+    Returns a dict of post pk to a dict of (format, width) to thumbnail.
+    """
+    with timed('thumbnails'):
+        found = _resolve({
+            (post.pk, image_format, width): (post.image, geometry, options)
+            for post in posts if post.image
+            for image_format, width, geometry, options in image_variants()
+        })
+    variants = {}
+    for (pk, image_format, width), thumbnail in found.items():
+        variants.setdefault(pk, {})[image_format, width] = thumbnail
+    return variants
+
+
+def variants_of(post):
+    """Return the ready responsive variants of a post image.
+
+    Uses the variants prefetched into post.image_variants, if any, and
+    schedules the ones that are not ready yet instead of making them.
+    """
+    with timed('thumbnails'):
+        variants = getattr(post, 'image_variants', None)
+        if variants is None:
+            variants = resolve_image_variants([post]).get(post.pk, {})
+        missing = len(variants) < len(list(image_variants()))
+        if missing and cache.add(
+            f'thumbnails_scheduled:{post.image.name}', True, SCHEDULE_TIMEOUT
+        ):
+            schedule_thumbnails(post.image.name)
+        return variants
+
+
+def prefetch_image_variants(posts):
+    """Set ready responsive variants as post.image_variants on every
+    post."""
+    posts = list(posts)
+    variants = resolve_image_variants(posts)
+    for post in posts:
+        post.image_variants = variants.get(post.pk, {})
@@ -0,0 +1,238 @@
+"""Materialized home timelines.
+
+Every post is written into the timelines of its author's followers
+when it is published, so the follow feed is read from one indexed
+range instead of merging the posts of all followed authors.
+
+Authors with TIMELINE_PUSH_THRESHOLD followers or more are not pushed,
+one post of theirs would write too many rows. Their posts are pulled
+into the feed at read time instead. Authors are classed by their
+followers_count counter, and a follow or unfollow crossing the
+threshold moves the author's posts into or out of the timelines.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery, Window
+from django.db.models.functions import RowNumber
+
+from .caching import feed_version_key
+from .counters import counters_for
+from .models import Follow, Post, TimelineEntry, UserCounters
+
+User = get_user_model()
+
+
+def make_entry(user_id, post):
+    return TimelineEntry(
+        user_id=user_id,
+        post=post,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def pulled_authors(user):
+    """Followed authors too popular to be pushed into the timeline."""
+    return Follow.objects.filter(
+        user=user,
+        author__counters__followers_count__gte=(
+            settings.TIMELINE_PUSH_THRESHOLD
+        ),
+    ).values_list('author', flat=True)
+
+
+def trim(user_ids):
+    """Keep no more than TIMELINE_DEPTH newest entries per timeline,
+    with one statement for all the timelines."""
+    depth = settings.TIMELINE_DEPTH
+    # the newest entry past the depth of every timeline, if any; found
+    # by the timeline index, unlike a window over whole timelines
+    edges = User.objects.order_by().filter(pk__in=user_ids).annotate(
+        edge=Subquery(
+            TimelineEntry.objects.filter(
+                user=OuterRef('pk')
+            ).order_by('-pub_date', '-post_id').values('pk')[depth:depth + 1]
+        ),
+    ).values_list('pk', 'edge')
+    sql, params = edges.query.sql_with_params()
+    table = TimelineEntry._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT entry.id FROM ({sql}) edges '
+            f'JOIN {table} edge ON edge.id = edges.edge '
+            f'JOIN {table} entry ON entry.user_id = edges.id '
+            f'WHERE entry.pub_date < edge.pub_date OR ('
+            f'entry.pub_date = edge.pub_date AND entry.post_id <= edge.post_id'
+            f'))',
+            params,
+        )
+
+
+def pushed_followers(author_id):
+    """Ids of the followers the author's posts are pushed to, none for
+    a pulled author."""
+    return list(
+        Follow.objects.filter(author=author_id).exclude(
+            author__counters__followers_count__gte=(
+                settings.TIMELINE_PUSH_THRESHOLD
+            )
+        ).values_list('user', flat=True)
+    )
+
+
+def push_post(post, follower_ids):
+    """Write a new post into the timelines of the author's followers,
+    the pushed_followers() of the author."""
+    if not follower_ids:
+        return
+    TimelineEntry.objects.bulk_create(
+        [make_entry(user_id, post) for user_id in follower_ids],
+        ignore_conflicts=True,
+    )
+    trim(follower_ids)
+
+
+def backfill(user_id, author_id):
+    """Fill a timeline with recent posts of a newly followed author,
+    unless the author is pulled, with one query."""
+    posts = Post.objects.filter(author=author_id).exclude(
+        author__counters__followers_count__gte=(
+            settings.TIMELINE_PUSH_THRESHOLD
+        )
+    ).order_by('-pub_date', '-pk').values(
+        'pk', 'author', 'pub_date'
+    )[:settings.TIMELINE_DEPTH]
+    posts_sql, posts_params = posts.query.sql_with_params()
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT %s, posts.id, posts.author_id, posts.pub_date '
+            f'FROM ({posts_sql}) posts '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [user_id, *posts_params],
+        )
+        inserted = cursor.rowcount
+    if inserted:
+        trim([user_id])
+
+
+def prune(user_id, author_id):
+    """Remove posts of an unfollowed author from a timeline."""
+    TimelineEntry.objects.filter(user=user_id, author=author_id).delete()
+
+
+def followers_of(author_id):
+    return Follow.objects.filter(author=author_id).values('user')
+
+
+def drop_author(author_id):
+    """Remove posts of an author from the timelines of the followers."""
+    TimelineEntry.objects.filter(
+        user__in=followers_of(author_id), author=author_id
+    ).delete()
+
+
+def push_author(author_id):
+    """Write recent posts of an author into the timelines of every
+    follower with one query, as if they had been pushed."""
+    drop_author(author_id)
+    posts = Post.objects.filter(author=author_id).order_by(
+        '-pub_date', '-pk'
+    ).values('pk', 'author', 'pub_date')[:settings.TIMELINE_DEPTH]
+    followers_sql, followers_params = (
+        followers_of(author_id).query.sql_with_params()
+    )
+    posts_sql, posts_params = posts.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT followers.user_id, posts.id, posts.author_id, '
+            f'posts.pub_date FROM ({followers_sql}) followers '
+            f'CROSS JOIN ({posts_sql}) posts',
+            [*followers_params, *posts_params],
+        )
+    trim(followers_of(author_id))
+    # pages cached while the author was pulled are not keyed by the
+    # follow versions alone, those may still hold older pages
+    cache.delete_many([
+        feed_version_key('follow', user_id)
+        for user_id in followers_of(author_id).values_list('user', flat=True)
+    ])
+
+
+def followers_changed(author_id, delta):
+    """Move an author to the other class when their followers count,
+    changed by delta, crossed TIMELINE_PUSH_THRESHOLD.
+
+    Posts written while the author was pulled would be missing from
+    the timelines once they are pushed again, and the other way round.
+    """
+    threshold = settings.TIMELINE_PUSH_THRESHOLD
+    followers = counters_for(author_id).followers_count
+    before = followers - delta
+    if before < threshold <= followers:
+        drop_author(author_id)
+    elif followers < threshold <= before:
+        push_author(author_id)
+
+
+def popular_authors():
+    """Ids of every author whose posts are pulled, not pushed."""
+    return UserCounters.objects.filter(
+        followers_count__gte=settings.TIMELINE_PUSH_THRESHOLD
+    ).values_list('user', flat=True)
+
+
+def rebuild(user_ids, pulled):
+    """Fill the timelines of the users anew with one query, leaving
+    out posts of the pulled authors."""
+    TimelineEntry.objects.filter(user__in=user_ids).delete()
+    follower = F('author__following__user')
+    ranked = Post.objects.order_by().filter(
+        author__following__user__in=user_ids
+    ).exclude(author__in=pulled).annotate(
+        follower=follower,
+        place=Window(
+            RowNumber(),
+            partition_by=[follower],
+            order_by=[F('pub_date').desc(), F('pk').desc()],
+        ),
+    ).values_list('follower', 'pk', 'author', 'pub_date', 'place')
+    sql, params = ranked.query.sql_with_params()
+    # a window can not be filtered on in the ORM
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT follower, id, author_id, pub_date FROM ({sql}) ranked '
+            f'WHERE place <= %s',
+            [*params, settings.TIMELINE_DEPTH],
+        )
+
+
+def timeline_posts(user, pulled=None):
+    """Posts of the user's home timeline, newest first.
+
+    pulled are the ids of the pulled authors the user follows, looked
+    up when not given.
+    """
+    posts = Post.objects.feed()
+    if pulled is None:
+        pulled = list(pulled_authors(user))
+    if not pulled:
+        return posts.filter(
+            timeline_entries__user=user
+        ).order_by(
+            '-timeline_entries__pub_date', '-timeline_entries__post__pk'
+        )
+    pushed = TimelineEntry.objects.filter(user=user).values('post')
+    return posts.filter(
+        Q(pk__in=pushed) | Q(author__in=pulled)
+    ).order_by('-pub_date', '-pk')
@@ -0,0 +1,84 @@
+"""Checks of uploaded post images that keep memory use bounded.
+
+Uploads bigger than FILE_UPLOAD_MAX_MEMORY_SIZE are streamed to a
+temporary file by Django, and here an image is only opened lazily:
+Pillow reads the header to learn format and dimensions, and decodes
+pixels only when an oversized original has to be downsized, with JPEG
+draft mode decoding it straight at a reduced scale.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+# keyword arguments of Image.save for the formats we re-encode
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+
+def check_image(upload):
+    """Validate size and dimensions of an uploaded image.
+
+    Returns the lazily opened image, nothing is decoded yet.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ.',
+            code='file_too_big',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 1024 ** 2},
+        )
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение больше %(limit)s мегапикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    return image
+
+
+def downsize_image(upload, image):
+    """Return the upload shrunk to POST_IMAGE_MAX_SIDE, or the upload
+    itself when it is small enough or can not be re-encoded."""
+    side = settings.POST_IMAGE_MAX_SIDE
+    image_format = image.format
+    if (max(image.size) <= side or image_format not in SAVE_OPTIONS
+            or getattr(image, 'is_animated', False)):
+        return upload
+    image.draft('RGB', (side, side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((side, side), Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, **SAVE_OPTIONS[image_format])
+    return ContentFile(buffer.getvalue(), name=upload.name)
+
+
+def clean_upload(upload):
+    """Validate a freshly uploaded image and downsize it if needed.
+
+    Anything but a new upload, like the image a post already has, is
+    returned untouched.
+    """
+    if not isinstance(upload, UploadedFile):
+        return upload
+    # Image.close() would close the upload itself, so it is not called
+    image = check_image(upload)
+    try:
+        return downsize_image(upload, image)
+    finally:
+        upload.seek(0)
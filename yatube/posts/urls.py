@@ -12,6 +12,8 @@ urlpatterns = [
     path('profile/<str:username>/', views.profile, name='profile'),
     # View specific post
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    # Full-text search
+    path('search/', views.search, name='search'),
     # Create new post
     path('create/', views.post_create, name='post_create'),
     # Edit a post
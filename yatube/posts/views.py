@@ -1,8 +1,14 @@
-from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from .models import Post, Group, User, Follow
 from .forms import PostForm, CommentForm
+from .caching import feed_cache, follow_feed_cache
+from .counters import (change_comments_count, change_user_counters,
+                       counters_for)
+from .paginators import feed_count_key, paginate
+from .search import search_posts
+from .timeline import followers_changed, pulled_authors, timeline_posts
 
 POSTS_DSPL = 10
 
@@ -10,13 +16,14 @@ POSTS_DSPL = 10
 def index(request):
     template = 'posts/index.html'
     title = 'Последние обновления на сайте'
-    posts = Post.objects.all()
-    paginator = Paginator(posts, POSTS_DSPL)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.feed()
+    page_obj = paginate(
+        request, posts, POSTS_DSPL, feed_count_key('index')
+    )
     context = {
         'title': title,
         'page_obj': page_obj,
+        'feed_cache': feed_cache('index'),
     }
     return render(request, template, context)
 
@@ -24,13 +31,14 @@ def index(request):
 def group_list(request, pk):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=pk)
-    posts = group.posts.all()
-    paginator = Paginator(posts, POSTS_DSPL)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.feed()
+    page_obj = paginate(
+        request, posts, POSTS_DSPL, feed_count_key('group', group.pk)
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
+        'feed_cache': feed_cache('group', group.pk),
     }
     return render(request, template, context)
 
@@ -38,39 +46,52 @@ def group_list(request, pk):
 def profile(request, username):
     template = 'posts/profile.html'
     author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    paginator = Paginator(posts, POSTS_DSPL)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = author.posts.feed()
+    page_obj = paginate(
+        request, posts, POSTS_DSPL, feed_count_key('profile', author.pk)
+    )
     title = ('Профиль пользователя ' + str(author.get_full_name()))
-    try:
-        current_user = User.objects.get(username=request.user)
-    except User.DoesNotExist:  # None for anonymous
-        current_user = None
-    if Follow.objects.filter(user=current_user, author=author):
-        following = True
-    else:
-        following = False
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(user=request.user, author=author).exists()
+    )
     context = {'title': title,
                'author': author,
                'posts': posts,
                'page_obj': page_obj,
                'following': following,
+               'counters': counters_for(author.pk),
+               'feed_cache': feed_cache('profile', author.pk),
                }
     return render(request, template, context)
 
 
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     form = CommentForm()
     title = 'Пост ' + post.text[:30]
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         'title': title,
         'post': post,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'author_counters': counters_for(post.author_id),
+    }
+    return render(request, template, context)
+
+
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '')[:200]
+    page_obj = search_posts(query, request.GET.get('after'), POSTS_DSPL)
+    context = {
+        'title': 'Поиск',
+        'query': query,
+        'page_obj': page_obj,
     }
     return render(request, template, context)
 
@@ -84,7 +105,9 @@ def post_create(request):
     if form.is_valid():
         new_post = form.save(commit=False)
         new_post.author = request.user
-        new_post.save()
+        with transaction.atomic():
+            new_post.save()
+            change_user_counters(request.user.pk, posts_count=1)
         return redirect(to='posts:profile', username=request.user)
     template = 'posts/create_post.html'
     title = 'Создать новый пост'
@@ -112,7 +135,6 @@ def post_edit(request, post_id):
         return redirect(to='posts:post_detail', post_id=post.pk)
     template = 'posts/create_post.html'
     title = 'Редактировать пост'
-    form = PostForm(instance=post)
     is_edit = True
     context = {
         'title': title,
@@ -131,45 +153,60 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
-        return redirect('posts:post_detail', post_id=post_id)
+        with transaction.atomic():
+            # saving refreshes cached feed pages, they must see the count
+            change_comments_count(post.pk, 1)
+            comment.save()
+    return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
     title = 'Посты любимых авторов'
-    current_user_pk = User.objects.get(username=request.user).pk
-    followings = Follow.objects.filter(user=current_user_pk)
-    author_list = followings.values_list('author', flat=True)
-    posts = Post.objects.filter(author__in=author_list)
-    paginator = Paginator(posts, POSTS_DSPL)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    pulled = list(pulled_authors(request.user))
+    posts = timeline_posts(request.user, pulled)
+    feed = follow_feed_cache(request.user.pk, pulled)
+    # the version changes with every post of the feed, so the total is
+    # never dropped explicitly
+    page_obj = paginate(
+        request, posts, POSTS_DSPL,
+        feed_count_key('follow', f'{request.user.pk}:{feed.version}'),
+    )
     context = {
         'title': title,
         'page_obj': page_obj,
+        'feed_cache': feed,
     }
     return render(request, template, context)
 
 
 @login_required
 def profile_follow(request, username):
-    current_user = User.objects.get(username=request.user)
     author = get_object_or_404(User, username=username)
-    if (username != str(request.user)
-            and not(Follow.objects.filter(user=current_user, author=author))):
-        Follow.objects.create(
-            user=current_user,
-            author=author,
-        )
+    if author != request.user:
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(
+                user=request.user,
+                author=author,
+            )
+            if created:
+                change_user_counters(request.user.pk, following_count=1)
+                change_user_counters(author.pk, followers_count=1)
+                followers_changed(author.pk, 1)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    current_author = User.objects.get(username=username)
-    current_user = User.objects.get(username=request.user)
-    Follow.objects.filter(user=current_user, author=current_author).delete()
+    author = get_object_or_404(User, username=username)
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(
+            user=request.user, author=author
+        ).delete()
+        if deleted:
+            change_user_counters(request.user.pk, following_count=-deleted)
+            change_user_counters(author.pk, followers_count=-deleted)
+            followers_changed(author.pk, -deleted)
 
     return redirect('posts:profile', username=username)
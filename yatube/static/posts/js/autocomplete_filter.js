@@ -0,0 +1,8 @@
+// Apply an autocomplete list filter as soon as a value is picked.
+'use strict';
+{
+    const $ = django.jQuery;
+    $(document).on('change', '.autocomplete-filter select', function() {
+        this.form.submit();
+    });
+}
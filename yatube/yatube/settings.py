@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import importlib.util
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -53,28 +55,44 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     # 3rd
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.NPlusOneMiddleware',
+    'core.middleware.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    # last, so that it times URL resolution apart from the view
+    'core.middleware.ProfilingMiddleware',
 ]
 
+# the toolbar is for development only: off without DEBUG, with
+# DEBUG_TOOLBAR=0 in the environment or when it is not installed
+DEBUG_TOOLBAR = (
+    DEBUG
+    and os.environ.get('DEBUG_TOOLBAR', '1') == '1'
+    and importlib.util.find_spec('debug_toolbar') is not None
+)
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates with rendering time profiled
+        'BACKEND': 'core.profiling.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -85,6 +103,10 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',  # own current year processor
             ],
+            # {% load cache %} that counts fragment cache hits
+            'libraries': {
+                'cache': 'core.templatetags.metered_cache',
+            },
         },
     },
 ]
@@ -145,6 +167,125 @@ CACHES = {
 }
 
 
+# Feeds
+
+# how many newest posts a materialized home timeline keeps
+TIMELINE_DEPTH = 800
+# authors with this many followers are merged into feeds at read time
+TIMELINE_PUSH_THRESHOLD = 1000
+# feed pages are cached until a post or a comment changes them
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+
+# Query budgets
+
+# most queries a request to a view may make, by URL name, session and
+# user lookups included; going over is logged as a warning
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:group_list': 6,
+    'posts:profile': 8,
+    'posts:post_detail': 6,
+    'posts:search': 4,
+    'posts:post_create': 8,
+    'posts:post_edit': 8,
+    'posts:add_comment': 8,
+    'posts:follow_index': 6,
+    'posts:profile_follow': 10,
+    'posts:profile_unfollow': 9,
+    'users:signup': 2,
+    'users:login': 2,
+    'users:logout': 4,
+    'about:author': 2,
+    'about:tech': 2,
+}
+# raise instead of logging, for tests
+QUERY_BUDGETS_STRICT = False
+# report query shapes a request makes more than NPLUSONE_THRESHOLD
+# times, like a lookup per row of a list; slow, for development
+NPLUSONE_DETECTION = DEBUG
+NPLUSONE_THRESHOLD = 5
+NPLUSONE_STRICT = False
+
+
+# Profiling
+
+# share of requests whose phases are timed, from 0 to 1; they get a
+# Server-Timing header and a JSON line in the core.profiling log
+PROFILING_SAMPLE_RATE = 0.01
+
+
+# Slow queries
+
+# queries of a request slower than this, in seconds, are logged with
+# their query plan to SLOW_QUERY_LOG; None turns the log off
+SLOW_QUERY_THRESHOLD = 0.1
+# outside of the source tree, like METRICS_DIR
+SLOW_QUERY_LOG = os.path.join(
+    tempfile.gettempdir(), 'yatube_slow_queries.log'
+)
+
+
+# Logging
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'encoding': 'utf-8',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': 'INFO'},
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
+# Metrics
+
+# every process adds its metrics to a file here and the admin-only
+# metrics page sums them; must be shared by the workers of the site and
+# kept outside of the source tree, tests and runserver write there too
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'yatube_metrics')
+
+
+# Thumbnails
+
+# responsive variants of post images: every width in every format,
+# cropped to one ratio; formats go in order of preference, the last
+# one is the fallback for browsers that know none of the others
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_SIZES = '(min-width: 992px) 960px, 100vw'
+# limits of uploaded post images, bigger originals are downsized to
+# POST_IMAGE_MAX_SIDE before they are stored
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+# uploads above this size are streamed to a temporary file, not memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024
+# generate in background threads, or inside the request when False
+POST_THUMBNAILS_ASYNC = True
+POST_THUMBNAILS_WORKERS = 2
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 